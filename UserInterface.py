@@ -1,28 +1,151 @@
 import sys
 import os
-import base64
-import io
-import re
+import logging
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QLabel, QTextEdit,
-    QHBoxLayout, QVBoxLayout, QSplitter, QScrollArea, QFrame,
-    QFileDialog, QStackedWidget,
+    QHBoxLayout, QVBoxLayout, QSplitter, QFrame,
+    QFileDialog, QStackedWidget, QListWidget, QListWidgetItem, QListView,
+    QStyledItemDelegate, QMessageBox,
 )
-from PyQt5.QtGui import QPixmap, QFontDatabase, QFont, QTextDocument, QPainter
+from PyQt5.QtGui import QPixmap, QPixmapCache, QFontDatabase, QFont, QTextDocument, QPainter
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal, QAbstractListModel, QModelIndex, QSize
 from PyQt5.QtPrintSupport import QPrinter
-from openai import OpenAI
-from pdfminer.high_level import extract_text
 from dotenv import load_dotenv
-import fitz  # PyMuPDF
-import PIL.Image  # Pillow
+from work_queue import WorkQueue, DONE, FAILED
+from results_store import get_store
+from session import Session
+from instrumentation import record_cache_hit, start_metrics_server
+from dedup import index_document, reuse_duplicate
+from incremental import reanalyze, update_highlight
+from models import ImageFinding
+from paragraph_index import matches_by_paragraph, paragraph_index, render_highlighted_html, render_paragraph_html
+from pdf_export import collect_highlights, export_annotated_pdf
+from prefetch import PREFETCH_ENABLED, get_prefetcher
+from thumbnails import THUMBNAIL_SIZE, thumbnail_path
+from pipeline import (
+    extract_article, run_analysis, run_triage_score, run_triggers,
+    annotate_article, run_bias_highlight, split_highlight_output,
+    run_explanation_summary, run_image_analysis, cleanup_extracted_images, TRIAGED_ANALYSIS,
+)
+
+# Image results for a QListView. Rows have a fixed size, so the view only
+# asks for the thumbnails of rows on screen; those are loaded from the
+# thumbnail cache on first paint and kept in QPixmapCache.
+class ImageListModel(QAbstractListModel):
+    ROW_HEIGHT = THUMBNAIL_SIZE + 20
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.images = []
+        self.thumbnails = {}
+
+    def set_images(self, images):
+        self.beginResetModel()
+        self.images = list(images)
+        self.thumbnails = {}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.images)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image = self.images[index.row()]
+        path = image.path
+        if role == Qt.DisplayRole:
+            return image.summary
+        if role == Qt.DecorationRole and path:
+            return self._thumbnail(index.row(), path)
+        if role == Qt.SizeHintRole:
+            return QSize(THUMBNAIL_SIZE, self.ROW_HEIGHT if path else 40)
+        return None
+
+    def _thumbnail(self, row, path):
+        if row not in self.thumbnails:
+            try:
+                self.thumbnails[row] = thumbnail_path(path)
+            except OSError:
+                self.thumbnails[row] = None
+        thumb = self.thumbnails[row]
+        if thumb is None:
+            return None
+        pixmap = QPixmapCache.find(thumb)
+        if pixmap is None or pixmap.isNull():
+            pixmap = QPixmap(thumb)
+            QPixmapCache.insert(thumb, pixmap)
+        return pixmap
+
+# Annotated article for a QListView, one row per paragraph. Rows are added in
+# batches as the view scrolls towards the end (canFetchMore/fetchMore) and a
+# paragraph's HTML is only built when its row is laid out or painted, so a
+# 1,000-page article is never turned into one HTML string or QTextDocument.
+class AnnotatedParagraphModel(QAbstractListModel):
+    BATCH = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.article_text = None
+        self.spans = []
+        self.matches = {}
+        self.loaded = 0
+
+    def set_article(self, article_text, matches):
+        self.beginResetModel()
+        self.article_text = article_text
+        self.spans = paragraph_index(article_text).spans if article_text else []
+        self.matches = matches_by_paragraph(matches)
+        self.loaded = 0
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.spans)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.BATCH, len(self.spans) - self.loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        row = index.row()
+        return render_paragraph_html(self.article_text, self.spans[row], self.matches.get(row + 1, ()))
+
+# Paints a row's HTML with a QTextDocument wrapped to the view's width
+class HtmlParagraphDelegate(QStyledItemDelegate):
+    MARGIN = 12
+
+    def _document(self, index, width):
+        document = QTextDocument()
+        document.setDocumentMargin(self.MARGIN)
+        document.setHtml(f"<div style='font-size:14px; color:black;'>{index.data()}</div>")
+        document.setTextWidth(max(width, 100))
+        return document
+
+    def paint(self, painter, option, index):
+        document = self._document(index, option.rect.width())
+        painter.save()
+        painter.translate(option.rect.topLeft())
+        document.drawContents(painter)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        width = self.parent().viewport().width()
+        return QSize(width, int(self._document(index, width).size().height()))
 
 class AnnotatedDocumentWindow(QWidget):
     def __init__(self, stacked_widget):
         super().__init__()
         self.stacked_widget = stacked_widget
-        self.trigger_phrases = []
+        self.session = None
 
         self.setStyleSheet("background-color: white;")
         main_layout = QVBoxLayout()
@@ -85,7 +208,22 @@ class AnnotatedDocumentWindow(QWidget):
         self.text_box = QTextEdit()
         self.text_box.setReadOnly(True)
         self.text_box.setStyleSheet("font-size: 14px; background-color: white; color: black; padding: 12px;")
-        content_layout.addWidget(self.text_box)
+
+        # Trigger phrases found in the article are shown paragraph by
+        # paragraph, loaded as the user scrolls
+        self.paragraph_model = AnnotatedParagraphModel(self)
+        self.paragraph_view = QListView()
+        self.paragraph_view.setModel(self.paragraph_model)
+        self.paragraph_view.setItemDelegate(HtmlParagraphDelegate(self.paragraph_view))
+        self.paragraph_view.setSelectionMode(QListView.NoSelection)
+        self.paragraph_view.setResizeMode(QListView.Adjust)
+        self.paragraph_view.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.paragraph_view.setStyleSheet("background-color: white; border: none;")
+
+        self.content_stack = QStackedWidget()
+        self.content_stack.addWidget(self.text_box)
+        self.content_stack.addWidget(self.paragraph_view)
+        content_layout.addWidget(self.content_stack)
 
         # Sidebar with colored buttons
         self.sidebar = QWidget()
@@ -159,8 +297,27 @@ class AnnotatedDocumentWindow(QWidget):
         if not filepath.endswith(".pdf"):
             filepath += ".pdf"
 
+        # PDFs are annotated in place, keeping the original layout; images,
+        # documents without any highlights and PDFs whose text layer has none
+        # of the phrases (image-only or OCR'd pages) fall back to printing the view
+        session = self.session
+        if session is not None and session.pdf_path and session.pdf_path.lower().endswith(".pdf"):
+            result = get_store().get_result(session.doc_hash)
+            highlights = collect_highlights(result.triggers if result else None, session.highlights)
+            if highlights:
+                found, missing = export_annotated_pdf(session.pdf_path, filepath, highlights)
+                if found:
+                    if missing:
+                        QMessageBox.warning(self, "Export to PDF",
+                                            f"{missing} of {found + missing} highlighted phrases weren't found in "
+                                            "the PDF's text and are not annotated.")
+                    return
+
         document = QTextDocument()
-        document.setHtml(self.text_box.toHtml())
+        if self.content_stack.currentWidget() is self.paragraph_view:
+            document.setHtml(render_highlighted_html(session.article_text, session.annotated_matches))
+        else:
+            document.setHtml(self.text_box.toHtml())
 
         printer = QPrinter()
         printer.setOutputFormat(QPrinter.PdfFormat)
@@ -168,389 +325,107 @@ class AnnotatedDocumentWindow(QWidget):
 
         document.print_(printer)
 
-    def load_article(self, article_path):
-        try:
-            with open(article_path, "r") as f:
-                self.article_text = f.read()
-            with open("trigger_phrases.txt", "r") as file:
-                self.trigger_text = file.read()
-            self.text_box.setHtml("<i>Press 'Generate' to highlight trigger phrases within the document, or use the buttons on the right to highlight where the types of bias are found.</i>")
-        except Exception as e:
-            self.text_box.setText("Could not load article text.\n\n" + str(e))
+    def load_session(self, session):
+        self.session = session
+        self.explanation_summary_box.clear()
+        self.paragraph_model.set_article(None, [])
+        self.content_stack.setCurrentWidget(self.text_box)
+        self.text_box.setHtml("<i>Press 'Generate' to highlight trigger phrases within the document, or use the buttons on the right to highlight where the types of bias are found.</i>")
 
     def generate_annotated_document(self):
-        if not hasattr(self, 'article_text') or not hasattr(self, 'trigger_text'):
+        session = self.session
+        if session is not None and session.article_text and not session.trigger_text:
+            session.trigger_text = get_prefetcher().take(session.doc_hash, "run_triggers")
+        self.content_stack.setCurrentWidget(self.text_box)
+        if session is None or not session.article_text or not session.trigger_text:
             self.text_box.setText("Article or trigger phrases not loaded.")
             return
 
-        self.text_box.setText("Generating annotated document...")
-        QApplication.processEvents()
-        highlighted_html = run_annotated_highlighted_article(self.article_text, self.trigger_text)
-
-        highlighted_html = re.sub(r"```(?:html)?\n?", "", highlighted_html)
-        highlighted_html = highlighted_html.replace("```", "")
-
-        self.text_box.setHtml(f"<div style='font-size:14px; color:black;'>{highlighted_html}</div>")
-
-    def highlight_narrative_bias(self):
-        if not hasattr(self, 'article_text'):
-            self.text_box.setText("Article not loaded.")
+        if session.annotated_matches is None:
+            prefetched = get_prefetcher().take(session.doc_hash, "annotated_highlight")
+            if prefetched is not None:
+                session.annotated_matches, session.annotated_html = prefetched
+        if session.annotated_matches is None:
+            self.text_box.setText("Generating annotated document...")
+            QApplication.processEvents()
+            stored = get_store().get(session.doc_hash)
+            session.annotated_matches, session.annotated_html = annotate_article(
+                session.article_text, session.trigger_text, token=session.token,
+                trigger_phrases=stored["result"].triggers if stored and stored["triggers"] else None)
+        if session.annotated_matches:
+            self.paragraph_model.set_article(session.article_text, session.annotated_matches)
+            self.content_stack.setCurrentWidget(self.paragraph_view)
             return
 
-        self.text_box.setText("Highlighting narrative bias...")
-        QApplication.processEvents()
-
-        highlighted_html = self.run_narrative_bias_highlight(self.article_text)
-        highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
-        highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
-
-        parts = highlighted_html.strip().split("\n\n")
-        if len(parts) > 1:
-            article_html = "\n\n".join(parts[:-2])  
-            explanation_html = "\n\n".join(parts[-2:])  
-        else:
-            article_html = highlighted_html
-            explanation_html = ""
-
-        try:
-            with open("explanation.txt", "w", encoding="utf-8") as f:
-                f.write(explanation_html)
-        except Exception as e:
-            print(f"Error writing explanation.txt: {e}")
-
-        combined_html = (
-            f"<div style='font-size:14px; color:black;'>{article_html}</div>"
-            f"<div style='font-size:14px; color:white;'>{explanation_html}</div>"
-        )
-       
-        self.text_box.setHtml(combined_html)
-        self.summarize_explanations()
-
-    def run_narrative_bias_highlight(self, article_text):
-        client = OpenAI()
-        prompt = (
-            "You are given an article. Identify two specific phrases that represent narrative bias.\n"
-            "Highlight them in the full text using this format:\n"
-            "- Wrap each paragraph in <p> tags.\n"
-            "- For each narrative bias phrase, wrap it with this HTML span:\n"
-            "  <span style='color:#1E90FF; font-weight:bold;'>phrase</span>\n\n"
-            "After the full article, add **two blank lines**.\n"
-            "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
-            "Phrase: \n"
-            "Explanation of why it's an example of narrative bias.\n\n"
-            "Separate each explanation with a single blank line.\n"
-            "Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:blue'>blue</span>) "
-            "and the list of formatted explanations underneath.\n"
-            "Do not include any extra text or markdown outside of the HTML.\n\n"
-            "Article:\n" + article_text
-        )
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=3000,
-        )
-
-        html = chat.choices[0].message.content
+        self.text_box.setHtml(f"<div style='font-size:14px; color:black;'>{session.annotated_html}</div>")
 
-        return html
+    def highlight_narrative_bias(self):
+        self.highlight_bias("narrative bias")
 
     def highlight_sentiment_bias(self):
-        if not hasattr(self, 'article_text'):
-            self.text_box.setText("Article not loaded.")
-            return
-
-        self.text_box.setText("Highlighting sentiment bias...")
-        QApplication.processEvents()
-
-        highlighted_html = self.run_sentiment_bias_highlight(self.article_text)
-        highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
-        highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
-
-        parts = highlighted_html.strip().split("\n\n")
-        if len(parts) > 1:
-                article_html = "\n\n".join(parts[:-2])  
-                explanation_html = "\n\n".join(parts[-2:])  
-        else:
-                article_html = highlighted_html
-                explanation_html = ""
-
-        try:
-                with open("explanation.txt", "w", encoding="utf-8") as f:
-                    f.write(explanation_html)
-        except Exception as e:
-                print(f"Error writing explanation.txt: {e}")
-
-        combined_html = (
-                f"<div style='font-size:14px; color:black;'>{article_html}</div>"
-                f"<div style='font-size:14px; color:white;'>{explanation_html}</div>"
-            )
-        
-        self.text_box.setHtml(combined_html)
-        self.summarize_explanations()
-
-    def run_sentiment_bias_highlight(self, article_text):
-        client = OpenAI()
-        prompt = (
-            "You are given an article. Identify two specific phrases that represent sentiment bias.\n"
-            "Highlight them in the full text using this format:\n"
-            "- Wrap each paragraph in <p> tags.\n"
-            "- For each sentiment bias phrase, wrap it with this HTML span:\n"
-            "  <span style='color:#FF4500; font-weight:bold;'>phrase</span>\n\n"
-            "After the full article, add **two blank lines**.\n"
-            "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
-            "Phrase: \n"
-            "Explanation of why it's an example of sentiment bias.\n\n"
-            "Separate each explanation with a single blank line.\n"
-            "Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:red'>red</span>) "
-            "and the list of formatted explanations underneath.\n"
-            "Do not include any extra text or markdown outside of the HTML.\n\n"
-            "Article:\n" + article_text
-        )
-        
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=3000,
-        )
-
-        html = chat.choices[0].message.content
-
-        return html
-
-
-    def run_regional_bias_highlight(self, article_text):
-        client = OpenAI()
-        prompt = (
-            "You are given an article. Identify two specific phrases that represent regional bias.\n"
-            "Highlight them in the full text using this format:\n"
-            "- Wrap each paragraph in <p> tags.\n"
-            "- For each regional bias phrase, wrap it with this HTML span:\n"
-            "  <span style='color:#228B22; font-weight:bold;'>phrase</span>\n\n"
-            "After the full article, add **two blank lines**.\n"
-             "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
-            "Phrase: \n"
-            "Explanation of why it's an example of regional bias.\n\n"
-            "Separate each explanation with a single blank line.\n"
-            "Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:green'>green</span>) "
-            "and the list of formatted explanations underneath.\n"
-            "Do not include any extra text or markdown outside of the HTML.\n\n"
-            "Article:\n" + article_text
-        )
-        
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=3000,
-        )
+        self.highlight_bias("sentiment bias")
 
-        html = chat.choices[0].message.content
-
-        return html
-    
     def highlight_regional_bias(self):
-        if not hasattr(self, 'article_text'):
-            self.text_box.setText("Article not loaded.")
-            return
-
-        self.text_box.setText("Highlighting regional bias...")
-        QApplication.processEvents()
-
-        highlighted_html = self.run_regional_bias_highlight(self.article_text)
-        highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
-        highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
-
-        parts = highlighted_html.strip().split("\n\n")
-        if len(parts) > 1:
-            article_html = "\n\n".join(parts[:-2])  
-            explanation_html = "\n\n".join(parts[-2:])  
-        else:
-            article_html = highlighted_html
-            explanation_html = ""
-
-        try:
-            with open("explanation.txt", "w", encoding="utf-8") as f:
-                f.write(explanation_html)
-        except Exception as e:
-            print(f"Error writing explanation.txt: {e}")
-
-        combined_html = (
-            f"<div style='font-size:14px; color:black;'>{article_html}</div>"
-            f"<div style='font-size:14px; color:white;'>{explanation_html}</div>"
-        )
-       
-        self.text_box.setHtml(combined_html)
-        self.summarize_explanations()
-
-  
-    def run_slant_highlight(self, article_text):
-        client = OpenAI()
-        prompt = (
-            "You are given an article. Identify two specific phrases that represent slant.\n"
-            "Highlight them in the full text using this format:\n"
-            "- Wrap each paragraph in <p> tags.\n"
-            "- For each slant phrase, wrap it with this HTML span:\n"
-            "  <span style='color:#DAA520; font-weight:bold;'>phrase</span>\n\n"
-            "After the full article, add **two blank lines**.\n"
-            "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
-            "Phrase: \n"
-            "Explanation of why it's an example of slant.\n\n"
-            "Separate each explanation with a single blank line.\n"
-            "Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:goldenrod'>goldenrod</span>) "
-            "and the list of formatted explanations underneath.\n"
-            "Do not include any extra text or markdown outside of the HTML.\n\n"
-            "Article:\n" + article_text
-        )
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=3000,
-        )
-
-        html = chat.choices[0].message.content
-
-        return html
+        self.highlight_bias("regional bias")
 
     def highlight_slant(self):
-        if not hasattr(self, 'article_text'):
-            self.text_box.setText("Article not loaded.")
-            return
-
-        self.text_box.setText("Highlighting slant...")
-        QApplication.processEvents()
-
-        highlighted_html = self.run_slant_highlight(self.article_text)
-        highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
-        highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
-
-        parts = highlighted_html.strip().split("\n\n")
-        if len(parts) > 1:
-            article_html = "\n\n".join(parts[:-2])  
-            explanation_html = "\n\n".join(parts[-2:])  
-        else:
-            article_html = highlighted_html
-            explanation_html = ""
+        self.highlight_bias("slant")
 
-        try:
-            with open("explanation.txt", "w", encoding="utf-8") as f:
-                f.write(explanation_html)
-        except Exception as e:
-            print(f"Error writing explanation.txt: {e}")
-
-        combined_html = (
-            f"<div style='font-size:14px; color:black;'>{article_html}</div>"
-            f"<div style='font-size:14px; color:white;'>{explanation_html}</div>"
-        )
-       
-        self.text_box.setHtml(combined_html)
-        self.summarize_explanations()
-
-    def run_coverage_depth_highlight(self, article_text):
-        client = OpenAI()
-        prompt = (
-            "You are given an article. Identify two specific phrases that represent coverage depth.\n"
-            "Highlight them in the full text using this format:\n"
-            "- Wrap each paragraph in <p> tags.\n"
-            "- For each coverage depth phrase, wrap it with this HTML span:\n"
-            "  <span style='color:#FF8C00; font-weight:bold;'>phrase</span>\n\n"
-            "After the full article, add **two blank lines**.\n"
-             "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
-            "Phrase: \n" 
-            "Explanation of why it's an example of coverage depth.\n\n"
-            "Separate each explanation with a single blank line.\n"
-            "Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:orange'>orange</span>) "
-            "and the list of formatted explanations underneath.\n"
-            "Do not include any extra text or markdown outside of the HTML.\n\n"
-            "Article:\n" + article_text
-        )
-        
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=3000,
-        )
-
-        html = chat.choices[0].message.content
-
-        return html
-    
     def highlight_coverage_depth(self):
-        if not hasattr(self, 'article_text'):
+        self.highlight_bias("coverage depth")
+
+    def highlight_bias(self, category):
+        self.content_stack.setCurrentWidget(self.text_box)
+        if self.session is None or not self.session.article_text:
             self.text_box.setText("Article not loaded.")
             return
 
-        self.text_box.setText("Highlighting coverage depth...")
+        self.text_box.setText(f"Highlighting {category}...")
         QApplication.processEvents()
 
-        highlighted_html = self.run_coverage_depth_highlight(self.article_text)
-        highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
-        highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
-
-        parts = highlighted_html.strip().split("\n\n")
-        if len(parts) > 1:
-            article_html = "\n\n".join(parts[:-2])  
-            explanation_html = "\n\n".join(parts[-2:])  
-        else:
-            article_html = highlighted_html
-            explanation_html = ""
-
-        try:
-            with open("explanation.txt", "w", encoding="utf-8") as f:
-                f.write(explanation_html)
-        except Exception as e:
-            print(f"Error writing explanation.txt: {e}")
+        # Reuse this session's result, or carry one over from the previous
+        # version of the document when its highlighted phrases still occur
+        session = self.session
+        highlighted_html = session.highlights.get(category)
+        if highlighted_html is not None:
+            record_cache_hit(category.replace(" ", "_") + "_highlight")
+        elif category in session.previous_highlights:
+            highlighted_html = update_highlight(session.previous_highlights.pop(category), session.article_text, category)
+        if highlighted_html is None:
+            highlighted_html = run_bias_highlight(session.article_text, category, token=session.token)
+        session.highlights[category] = highlighted_html
+        article_html, explanation_html = split_highlight_output(highlighted_html)
+        self.session.explanation = explanation_html
 
         combined_html = (
             f"<div style='font-size:14px; color:black;'>{article_html}</div>"
             f"<div style='font-size:14px; color:white;'>{explanation_html}</div>"
         )
-       
+
         self.text_box.setHtml(combined_html)
         self.summarize_explanations()
-    def summarize_explanations(self):
-        try:
-            with open("explanation.txt", "r", encoding="utf-8") as f:
-                explanation_text = f.read()
-        except Exception as e:
-            self.explanation_summary_box.setText(f"Failed to load explanation.txt: {e}")
-            return
 
+    def summarize_explanations(self):
+        explanation_text = self.session.explanation
         if not explanation_text.strip():
             self.explanation_summary_box.setText("No explanation text available.")
             return
 
-        client = OpenAI()
-        prompt = (
-            "You are given a block of text that includes phrases and their bias explanations. "
-            "Reformat the output into valid HTML where each phrase is bolded, followed by its explanation. "
-            "Use the following format:\n\n"
-            "Phrase: Explanation\n\n"
-            "Separate each pair with a single blank line. Return ONLY valid HTML. Do not return a list, dictionary, markdown, or code block.\n\n"
-            "Input:\n" + explanation_text
-        )
-
-        chat = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="gpt-4o-mini",
-            max_tokens=500,
-        )
-
-        formatted_output = chat.choices[0].message.content.strip()
-        self.explanation_summary_box.setHtml(formatted_output)
+        self.explanation_summary_box.setHtml(run_explanation_summary(explanation_text, token=self.session.token))
 
 class BiasDetectionApp(QWidget):
+    # emitted from queue worker threads, handled on the GUI thread
+    job_updated = pyqtSignal(dict)
+
     def __init__(self, stacked_widget, annotated_view):
         super().__init__()
         self.stacked_widget = stacked_widget
         self.annotated_view = annotated_view
+        self.setAcceptDrops(True)
 
         self.setStyleSheet("background-color: #a3b1c6;")
         self.setMinimumSize(1400, 900)
-        self.current_pdf_path = None
+        self.session = Session()
         self.trigger_phrases = []
 
         font_id = QFontDatabase.addApplicationFont("Roboto-ExtraBold.ttf")
@@ -613,12 +488,27 @@ class BiasDetectionApp(QWidget):
         self.filename_label.setStyleSheet("color: black;")
         self.filename_label.setAlignment(Qt.AlignCenter)
 
+        self.watch_button = QPushButton("Watch Folder")
+        self.watch_button.setFont(QFont(self.roboto_bold.family(), 10))
+        self.watch_button.setStyleSheet(self.import_button.styleSheet())
+        self.watch_button.setFixedSize(120, 30)
+        self.watch_button.clicked.connect(self.select_watch_folder)
+
         import_layout = QVBoxLayout()
         import_layout.addWidget(self.import_button)
+        import_layout.addWidget(self.watch_button)
         import_layout.addWidget(self.filename_label)
 
+        # Per-document status of the background queue; double-click a
+        # finished document to load its results
+        self.queue_list = QListWidget()
+        self.queue_list.setFixedHeight(90)
+        self.queue_list.setStyleSheet("background-color: #e0e0e0; color: black; border: 2px solid white; border-radius: 10px;")
+        self.queue_list.itemDoubleClicked.connect(self.load_queued_result)
+        self.queue_items = {}
+
         top_layout = QHBoxLayout()
-        top_layout.addStretch()
+        top_layout.addWidget(self.queue_list)
         top_layout.addLayout(import_layout)
 
         box_style = """
@@ -684,13 +574,16 @@ class BiasDetectionApp(QWidget):
         triggers_widget.setLayout(triggers_layout)
         triggers_widget.setStyleSheet(box_style)
 
-        self.image_scroll = QScrollArea()
-        self.image_container = QVBoxLayout()
-        image_widget_inner = QWidget()
-        image_widget_inner.setLayout(self.image_container)
-        self.image_scroll.setWidget(image_widget_inner)
-        self.image_scroll.setWidgetResizable(True)
-        self.image_scroll.setFrameShape(QFrame.StyledPanel)
+        self.image_model = ImageListModel(self)
+        self.image_list = QListView()
+        self.image_list.setModel(self.image_model)
+        self.image_list.setUniformItemSizes(True)
+        self.image_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.image_list.setWordWrap(True)
+        self.image_list.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.image_list.setSelectionMode(QListView.NoSelection)
+        self.image_list.setFont(self.roboto_bold)
+        self.image_list.setFrameShape(QFrame.StyledPanel)
 
         image_layout = QVBoxLayout()
         image_button = QPushButton("Image Analysis")
@@ -698,7 +591,7 @@ class BiasDetectionApp(QWidget):
         image_button.setStyleSheet(button_style)
         image_button.clicked.connect(self.run_images)
         image_layout.addWidget(image_button)
-        image_layout.addWidget(self.image_scroll)
+        image_layout.addWidget(self.image_list)
         image_widget = QWidget()
         image_widget.setLayout(image_layout)
         image_widget.setStyleSheet(box_style)
@@ -741,259 +634,226 @@ class BiasDetectionApp(QWidget):
         main_layout.addWidget(self.view_annotated_button, alignment=Qt.AlignCenter)
         self.setLayout(main_layout)
 
+        self.job_updated.connect(self.update_job_status)
+        self.work_queue = WorkQueue(on_update=self.job_updated.emit)
+        for job in self.work_queue.snapshot():
+            self.update_job_status(job)
+        self.work_queue.start()
+        if os.getenv("BIAS_INBOX_DIR"):
+            self.work_queue.watch(os.getenv("BIAS_INBOX_DIR"))
+
     def open_annotated_window(self):
-        if not os.path.exists("article.txt"):
+        if not self.session.article_text:
             return
-        self.annotated_view.load_article("article.txt")
+        self.annotated_view.load_session(self.session)
         self.stacked_widget.setCurrentIndex(1)
 
     def select_file(self):
-        filepath, _ = QFileDialog.getOpenFileName(
+        filepaths, _ = QFileDialog.getOpenFileNames(
             self, "Select File", "", "PDF and Image Files (*.pdf *.jpg *.jpeg)"
         )
-        if filepath:
-            self.current_pdf_path = filepath
-            filename = os.path.basename(filepath)
+        self.import_files(filepaths)
+
+    # A single file is opened for the buttons below; several are queued
+    def import_files(self, filepaths):
+        if len(filepaths) == 1:
+            self.open_session(Session(filepaths[0]))
+            filename = os.path.basename(filepaths[0])
             self.import_button.setText("Imported")
             self.filename_label.setText(filename)
+        elif filepaths:
+            self.work_queue.add(filepaths)
+            self.filename_label.setText(f"{len(filepaths)} files queued")
+
+    # Replaces the current document; the old session's files are removed
+    def open_session(self, session):
+        get_prefetcher().cancel()
+        self.clear_images()
+        old = self.session
+        if old.pdf_path and old.pdf_path == session.pdf_path and old.doc_hash != session.doc_hash:
+            session.previous_highlights = {**old.previous_highlights, **old.highlights}
+        old.close()
+        self.session = session
+
+    def select_watch_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Select Inbox Folder")
+        if directory:
+            self.work_queue.watch(directory)
+            self.watch_button.setText("Watching")
+            self.filename_label.setText(os.path.basename(directory))
+
+    def dragEnterEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        self.import_files([p for p in paths if p.lower().endswith((".pdf", ".jpg", ".jpeg"))])
+
+    def update_job_status(self, job):
+        item = self.queue_items.get(job["path"])
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, job["path"])
+            self.queue_list.addItem(item)
+            self.queue_items[job["path"]] = item
+        text = f"{os.path.basename(job['path'])} - {job['status']}"
+        if job["status"] == FAILED and job.get("error"):
+            text += f" ({job['error']})"
+        item.setText(text)
+
+    def load_queued_result(self, item):
+        job = next((j for j in self.work_queue.snapshot() if j["path"] == item.data(Qt.UserRole)), None)
+        if job is None or job["status"] != DONE:
+            return
+        stored = get_store().get(job["result"]["doc_hash"])
+        if stored is None:
+            return
+        session = Session(job["path"], doc_hash=stored["doc_hash"])
+        session.article_text = stored["article"]
+        session.analysis = stored["analysis"]
+        session.score_html = stored["score_html"]
+        session.trigger_text = stored["triggers"]
+        self.open_session(session)
+        self.filename_label.setText(os.path.basename(job["path"]))
+        self.analysis_box.setText(session.analysis)
+        self.score_box.setHtml(session.score_html or "")
+        self.triggers_box.setHtml(session.trigger_text or "")
+        self.view_annotated_button.setEnabled(True)
 
     def clear_images(self):
-        while self.image_container.count():
-            child = self.image_container.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
+        self.image_model.set_images([])
 
     def run_analysis(self):
-        if not self.current_pdf_path:
+        session = self.session
+        if not session.pdf_path:
             self.analysis_box.setText("Please import a file first.")
             return
-        text = extract_text(self.current_pdf_path)
-        with open("article.txt", "w") as f:
-            f.write(text)
-        with open("article.txt", "r") as f:
-            content = f.read()
+        # Documents analysed before are loaded from the results store; ones
+        # only cleared by a batch triage are analysed in full now
+        stored = get_store().get(session.doc_hash)
+        if stored and stored["analysis"] and stored["analysis"] != TRIAGED_ANALYSIS:
+            record_cache_hit("run_analysis")
+            session.article_text = stored["article"]
+            session.analysis = stored["analysis"]
+            self.analysis_box.setText(session.analysis)
+            self.view_annotated_button.setEnabled(True)
+            self.start_prefetch(stored)
+            return
+        session.article_text = extract_article(session.pdf_path, token=session.token)
         self.analysis_box.setText("Running bias analysis...")
         QApplication.processEvents()
-        self.analysis_result = run_analysis(content)
-        self.analysis_box.setText(self.analysis_result)
+        # An edited copy of a file analysed before only sends its changed
+        # paragraphs, unless most of them changed or the earlier version was
+        # only triaged; the score is left for run_score to recompute
+        previous = get_store().latest_for_path(session.pdf_path, exclude_hash=session.doc_hash)
+        triggers = score_html = result = None
+        analysed_in_full = False
+        if previous and previous["article"] and previous["analysis"] != TRIAGED_ANALYSIS:
+            result = reanalyze(previous["article"], previous["analysis"], previous["triggers"], session.article_text,
+                               token=session.token,
+                               previous_phrases=[t.phrase for t in previous["result"].triggers])
+        if result is not None:
+            session.analysis = result["analysis"]
+            triggers = result["triggers"]
+        # Near-duplicates of another analysed article reuse its results
+        elif reused := reuse_duplicate(session.article_text, exclude_hash=session.doc_hash, token=session.token):
+            session.analysis = reused["analysis"]
+            triggers, score_html = reused["triggers"], reused["score_html"]
+        else:
+            session.analysis = run_analysis(session.article_text, token=session.token)
+            analysed_in_full = True
+        get_store().save(session.doc_hash, path=session.pdf_path, article=session.article_text,
+                         analysis=session.analysis, score_html=score_html, triggers=triggers)
+        if analysed_in_full:
+            index_document(session.doc_hash, session.article_text)
+        self.analysis_box.setText(session.analysis)
         self.view_annotated_button.setEnabled(True)
+        self.start_prefetch({"score_html": score_html, "triggers": triggers})
+
+    # Starts the steps the user usually clicks next, skipping stored ones
+    def start_prefetch(self, stored):
+        if not PREFETCH_ENABLED:
+            return
+        session = self.session
+        doc_hash, article, analysis, token = session.doc_hash, session.article_text, session.analysis, session.token
+        tasks = {}
+        if not stored["score_html"]:
+            def score(prior):
+                score_html = run_triage_score(analysis, article, token=token)
+                get_store().save(doc_hash, score_html=score_html)
+                return score_html
+            tasks["run_score"] = score
+        if not stored["triggers"]:
+            def triggers(prior):
+                trigger_text = run_triggers(article, analysis, token=token)
+                get_store().save(doc_hash, triggers=trigger_text)
+                return trigger_text
+            tasks["run_triggers"] = triggers
+        stored_triggers = stored["triggers"]
+        stored_phrases = stored["result"].triggers if stored_triggers and stored.get("result") else None
+        tasks["annotated_highlight"] = lambda prior: annotate_article(
+            article, stored_triggers or prior("run_triggers"), token=token, trigger_phrases=stored_phrases)
+        get_prefetcher().start(doc_hash, tasks)
 
     def run_score(self):
-        if not hasattr(self, "analysis_result"):
+        session = self.session
+        if not session.analysis:
             self.score_box.setText("Run analysis first.")
             return
-        with open("article.txt", "r") as f:
-            content = f.read()
+        stored = get_store().get(session.doc_hash)
+        if stored and stored["score_html"]:
+            record_cache_hit("run_score")
+            session.score_html = stored["score_html"]
+            self.score_box.setHtml(session.score_html)
+            return
         self.score_box.setText("Scoring bias...")
         QApplication.processEvents()
-        score = run_score(self.analysis_result, content)
-        self.score_box.setHtml(score)
+        session.score_html = get_prefetcher().take(session.doc_hash, "run_score")
+        if session.score_html is None:
+            session.score_html = run_triage_score(session.analysis, session.article_text, token=session.token)
+            get_store().save(session.doc_hash, score_html=session.score_html)
+        self.score_box.setHtml(session.score_html)
 
 
     def run_triggers(self):
-        if not hasattr(self, "analysis_result"):
+        session = self.session
+        if not session.analysis:
             self.triggers_box.setText("Run analysis first.")
             return
-        with open("article.txt", "r") as f:
-            content = f.read()
+        stored = get_store().get(session.doc_hash)
+        if stored and stored["triggers"]:
+            record_cache_hit("run_triggers")
+            session.trigger_text = stored["triggers"]
+            self.triggers_box.setHtml(session.trigger_text)
+            return
         self.triggers_box.setText("Extracting trigger phrases...")
         QApplication.processEvents()
-        trigger_output = run_triggers(content, self.analysis_result)
-        self.triggers_box.setHtml(trigger_output)
+        session.trigger_text = get_prefetcher().take(session.doc_hash, "run_triggers")
+        if session.trigger_text is None:
+            session.trigger_text = run_triggers(session.article_text, session.analysis, token=session.token)
+            get_store().save(session.doc_hash, triggers=session.trigger_text)
+        self.triggers_box.setHtml(session.trigger_text)
 
 
     def run_images(self):
-        if not self.current_pdf_path:
+        session = self.session
+        if not session.pdf_path:
             return
         self.clear_images()
-        cleanup_extracted_images()
+        cleanup_extracted_images(session.workdir)
         QApplication.processEvents()
-        images = run_image_analysis(self.current_pdf_path)
+        images = run_image_analysis(session.pdf_path, session.workdir, token=session.token)
 
         if not images:
-            no_image_label = QLabel("No image found.")
-            no_image_label.setFont(self.roboto_bold)
-            no_image_label.setStyleSheet("margin: 10px; color: black;")
-            self.image_container.addWidget(no_image_label)
-            return
-
-        for path, summary in images:
-            img_label = QLabel()
-            pixmap = QPixmap(path).scaledToWidth(300, Qt.SmoothTransformation)
-            img_label.setPixmap(pixmap)
-            summary_label = QLabel(summary)
-            summary_label.setWordWrap(True)
-            summary_label.setFont(self.roboto_bold)
-            summary_label.setStyleSheet("margin-bottom: 15px;")
-            self.image_container.addWidget(img_label)
-            self.image_container.addWidget(summary_label)
-
-
-
-def run_analysis(file_content):
-    load_dotenv()
-    client = OpenAI()
-    prompt = (
-        "Analyze the following article for these bias categories:\n"
-        "Narrative Bias, Sentiment Bias, Regional Bias, Slant, and Coverage Depth.\n\n"
-        "Use only HTML formatting. For each section:\n"
-        "- Wrap the explanation in a <p> tag.\n"
-        "- Start with a <b> tag containing the category name, but color the header like so:\n"
-        "  • Narrative Bias: <span style='color:#1E90FF;'> (blue)\n"
-        "  • Sentiment Bias: <span style='color:#FF4500;'> (red-orange)\n"
-        "  • Regional Bias: <span style='color:#228B22;'> (green)\n"
-        "  • Slant: <span style='color:#DAA520;'> (goldenrod)\n"
-        "  • Coverage Depth: <span style='color:#FF8C00;'> (orange)\n"
-        "- Close the colored span and bold tag, and follow it with the analysis text.\n\n"
-        "Example:\n"
-        "<p><b><span style='color:#1E90FF;'>Narrative Bias:</span></b> This article uses a compelling 'us vs. them' story...</p>\n"
-        "<p><b><span style='color:#FF4500;'>Sentiment Bias:</span></b> The wording is emotionally charged...</p>\n"
-        "...and so on.\n\n"
-        "Do not use Markdown. Only return valid HTML.\n\n"
-        "Article:\n" + file_content
-    )
-    chat = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gpt-4o-mini",
-        max_tokens=650,
-    )
-    return chat.choices[0].message.content
-
-
-def run_score(analysis, file_content):
-    client = OpenAI()
-    prompt = (
-        "You are formatting an HTML block of text to display in a PyQt application.\n"
-        "Based on the analysis below, give a bias score out of 10 (10 = extremely biased), and provide a short summary explaining why.\n\n"
-        "Strict formatting instructions:\n"
-        "- Wrap the score line in a <p> tag, starting with <b>Score:</b> followed by the score (e.g., 6/10).\n"
-        "- Wrap the summary explanation in a separate <p> tag.\n"
-        "- Use ONLY HTML. Do NOT use Markdown or raw text formatting.\n"
-        "- Do NOT write anything before or after the <p> blocks.\n\n"
-        "Example:\n"
-        "<p><b>Score:</b> 7/10</p>\n<p>The article uses emotionally charged language to present a one-sided view...</p>\n\n"
-        "Now generate the output.\n\n"
-        "Analysis:\n" + analysis + "\n\nArticle:\n" + file_content
-    )
-
-    chat = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gpt-4o-mini",
-        max_tokens=650,
-    )
-
-    response = chat.choices[0].message.content.strip()
-
-    # Extract the score from the first <p> tag
-    match = re.search(r"<p><b>Score:</b>\s*(\d+)/10</p>", response)
-    if match:
-        score = int(match.group(1))
-        color = "red" if score >= 5 else "green"
-        colored_score_html = f"<p><b>Score:</b> <span style='color:{color};'>{score}/10</span></p>"
-        # Replace the plain score line with colored version
-        response = re.sub(r"<p><b>Score:</b>\s*\d+/10</p>", colored_score_html, response)
-
-    return response
-
-
-def run_triggers(file_content, analysis):
-    client = OpenAI()
-    prompt = (
-    "You are formatting an HTML block to display trigger phrases in a PyQt application.\n"
-    "Identify 3 trigger phrases that support the bias analysis below, and include the paragraph number for each.\n\n"
-    "Strict formatting instructions:\n"
-    "- Use ONLY HTML.\n"
-    "- For each phrase, wrap the output in a <p> tag.\n"
-    "- Bold the phrase label using <b>Trigger Phrase:</b> and bold the paragraph label with <b>Paragraph:</b>.\n"
-    "- Do NOT use Markdown (**bold**) or raw text formatting.\n"
-    "- Do NOT write anything outside the <p> blocks.\n\n"
-    "Example:\n"
-    "<p><b>Trigger Phrase:</b> 'They always lie to the people.'<br><b>Paragraph:</b> 3</p>\n"
-    "<p><b>Trigger Phrase:</b> 'A corrupt cabal controls the media.'<br><b>Paragraph:</b> 6</p>\n"
-    "<p><b>Trigger Phrase:</b> 'Voices of reason are silenced.'<br><b>Paragraph:</b> 8</p>\n\n"
-    "Now extract trigger phrases based on this analysis:\n" + analysis +
-    "\n\nFrom this article:\n" + file_content
-    )   
-    chat = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gpt-4o-mini",
-        max_tokens=300,
-    )
-    triggers = chat.choices[0].message.content
-
-    # Save to file so annotated view can use it
-    with open("trigger_phrases.txt", "w") as f:
-        f.write(triggers)
-
-    return triggers
-
-
-def run_annotated_highlighted_article(article_text, trigger_text):
-    client = OpenAI()
-    prompt = (
-        "Highlight the specific trigger phrases listed below in purple, bold text inside the article.\n\n"
-        "Trigger Phrases:\n" + trigger_text + "\n\n"
-        "Instructions:\n"
-        "- Wrap each paragraph of the article in a <p> tag.\n"
-        "- Within paragraphs, wrap each trigger phrase in this HTML span:\n"
-        "  <span style='color:purple; font-weight:bold;'>trigger phrase</span>\n"
-        "- Only modify exact phrases from the trigger list. Keep everything else unchanged.\n"
-        "- Use ONLY valid HTML and do not include explanations or intros.\n\n"
-        "- Exclude any unecessary text and just use the main paragraphs in the article. \n"
-        "Article:\n" + article_text
-    )
-    chat = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="gpt-4o-mini",
-        max_tokens=3000,
-    )
-    return chat.choices[0].message.content
-
-
-
-def run_image_analysis(pdf_path):
-    client = OpenAI()
-    result_blocks = []
-    prompt = "Briefly describe in 2-3 sentences how this image relates to the bias detected."
-    pdf = fitz.open(pdf_path)
-    counter = 1
-    for i in range(len(pdf)):
-        images = pdf[i].get_images()
-        for image in images:
-            base_img = pdf.extract_image(image[0])
-            image_data = base_img["image"]
-            img = PIL.Image.open(io.BytesIO(image_data))
-            ext = base_img["ext"]
-            img_path = f"image{counter}.{ext}"
-            img.save(img_path)
-            b64 = base64.b64encode(open(img_path, "rb").read()).decode("utf-8")
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": f"data:image/{ext};base64,{b64}"}}
-                    ]
-                }],
-                max_tokens=200,
-            )
-            summary = response.choices[0].message.content.strip()
-            result_blocks.append((img_path, summary))
-            counter += 1
-    return result_blocks
-
-
-def cleanup_extracted_images():
-    for filename in os.listdir():
-        if filename.lower().startswith("image") and filename.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".tiff")):
-            try:
-                os.remove(filename)
-            except Exception as e:
-                print(f"Could not delete {filename}: {e}")
-
+            images = [ImageFinding(None, "No image found.")]
+        self.image_model.set_images(images)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    load_dotenv()
+    if os.getenv("BIAS_METRICS_PORT"):
+        start_metrics_server(int(os.getenv("BIAS_METRICS_PORT")))
     app = QApplication(sys.argv)
     stacked_widget = QStackedWidget()
     annotated_view = AnnotatedDocumentWindow(stacked_widget)
@@ -1002,4 +862,8 @@ if __name__ == '__main__':
     stacked_widget.addWidget(annotated_view)
     stacked_widget.setCurrentIndex(0)
     stacked_widget.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    main_view.work_queue.shutdown()
+    get_prefetcher().shutdown()
+    main_view.session.close()
+    sys.exit(exit_code)
@@ -0,0 +1,170 @@
+import html
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger("bias_detection.export")
+
+# Batch export of analysed documents from the results store. Each document
+# becomes an annotated copy of its PDF and a standalone HTML report; documents
+# are spread over a process pool since both steps are CPU bound (PDF parsing
+# and layout), and each worker opens its own read connection to the store.
+
+EXPORT_WORKERS = int(os.getenv("BIAS_EXPORT_WORKERS", "0")) or os.cpu_count() or 1
+
+_REPORT = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Bias report: {title}</title>
+<style>
+body {{ font-family: Arial, sans-serif; max-width: 900px; margin: 2em auto; line-height: 1.5; }}
+section {{ margin-bottom: 2em; }}
+h2 {{ border-bottom: 1px solid #ccc; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<section><h2>Bias Score</h2>{score}</section>
+<section><h2>Bias Analysis</h2>{analysis}</section>
+<section><h2>Trigger Phrases</h2>{triggers}</section>
+<section><h2>Annotated Article</h2>{article}</section>
+</body>
+</html>
+"""
+
+_stores = {}
+
+
+def _store(db_path):
+    from results_store import ResultsStore
+
+    if db_path not in _stores:
+        _stores[db_path] = ResultsStore(db_path)
+    return _stores[db_path]
+
+
+def render_report(stored):
+    from paragraph_index import render_highlighted_html
+
+    article = stored["article"] or ""
+    matches = stored["result"].triggers
+    return _REPORT.format(
+        title=html.escape(os.path.basename(stored["path"] or stored["doc_hash"])),
+        score=stored["score_html"] or "<p>Not scored.</p>",
+        analysis=stored["analysis"] or "<p>Not analysed.</p>",
+        triggers=stored["triggers"] or "<p>No trigger phrases.</p>",
+        article=render_highlighted_html(article, matches),
+    )
+
+
+# Runs in a pool worker; returns per-document stats for the throughput report
+def export_document(doc_hash, output_dir, db_path, formats=("pdf", "html")):
+    from pdf_export import collect_highlights, export_annotated_pdf
+
+    start = time.perf_counter()
+    stored = _store(db_path).get(doc_hash)
+    if stored is None:
+        raise ValueError(f"{doc_hash} is not in the results store")
+
+    path = stored["path"] or ""
+    name = f"{os.path.splitext(os.path.basename(path))[0] or 'document'}-{doc_hash[:8]}"
+    result = {"doc_hash": doc_hash, "path": path, "pages": 0, "files": []}
+    if "pdf" in formats and path.lower().endswith(".pdf") and os.path.exists(path):
+        import fitz  # PyMuPDF
+
+        with fitz.open(path) as doc:
+            result["pages"] = len(doc)
+        output = os.path.join(output_dir, name + ".pdf")
+        result["highlights"], result["missing"] = export_annotated_pdf(
+            path, output, collect_highlights(stored["result"].triggers))
+        result["files"].append(output)
+    if "html" in formats:
+        output = os.path.join(output_dir, name + ".html")
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(render_report(stored))
+        result["files"].append(output)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def batch_export(doc_hashes, output_dir, workers=None, formats=("pdf", "html"), db_path=None, on_done=None):
+    from results_store import RESULTS_DB
+
+    db_path = db_path or RESULTS_DB
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or EXPORT_WORKERS
+    start = time.perf_counter()
+    results, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(export_document, h, output_dir, db_path, formats): h for h in doc_hashes}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failures.append({"doc_hash": futures[future], "error": f"{type(e).__name__}: {e}"})
+                logger.warning(json.dumps({"event": "export_failed", **failures[-1]}))
+                continue
+            results.append(result)
+            if on_done:
+                on_done(result)
+
+    wall = time.perf_counter() - start
+    pages = sum(r["pages"] for r in results)
+    report = {
+        "workers": workers,
+        "documents": len(results),
+        "failed": len(failures),
+        "pages": pages,
+        "files": sum(len(r["files"]) for r in results),
+        "wall_seconds": wall,
+        "cpu_seconds": sum(r["seconds"] for r in results),
+        "docs_per_second": len(results) / wall if wall else 0.0,
+        "pages_per_second": pages / wall if wall else 0.0,
+        "failures": failures,
+    }
+    logger.info(json.dumps({"event": "batch_export", **{k: v for k, v in report.items() if k != "failures"}}))
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from results_store import get_store
+
+    parser = argparse.ArgumentParser(description="Export annotated PDFs and HTML reports from the results store")
+    parser.add_argument("output_dir")
+    parser.add_argument("hashes", nargs="*", help="document hashes (default: all matching the filters)")
+    parser.add_argument("--min-score", type=int)
+    parser.add_argument("--max-score", type=int)
+    parser.add_argument("--category", help='e.g. "Slant" or "Narrative Bias"')
+    parser.add_argument("--days", type=float, help="only documents analysed in the last N days")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    parser.add_argument("--formats", default="pdf,html")
+    parser.add_argument("--json", dest="json_path", help="also write the throughput report as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    hashes = args.hashes
+    if not hashes:
+        since = time.time() - args.days * 86400 if args.days else None
+        rows = get_store().query(args.min_score, args.max_score, args.category, since, args.limit)
+        hashes = [row["doc_hash"] for row in rows]
+    if not hashes:
+        parser.exit(1, "No matching documents in the results store.\n")
+
+    report = batch_export(
+        hashes, args.output_dir, args.workers, tuple(f for f in args.formats.split(",") if f),
+        on_done=lambda r: print(f"{r['doc_hash'][:12]}  {r['pages']:>5}p  {r['seconds']:>7.2f}s  {r['path']}"),
+    )
+    for failure in report["failures"]:
+        print(f"{failure['doc_hash'][:12]}  FAILED  {failure['error']}")
+    print(f"{report['documents']} documents ({report['pages']} pages, {report['files']} files) "
+          f"in {report['wall_seconds']:.2f}s with {report['workers']} workers: "
+          f"{report['docs_per_second']:.2f} docs/s, {report['pages_per_second']:.1f} pages/s")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cancellation import CancelToken
+
+logger = logging.getLogger("bias_detection.batch")
+
+# Corpus runs in two stages. Extraction (pdfminer, OCR, image decoding) is
+# CPU bound and runs in a process pool, one document per worker, so it is
+# not serialized by the GIL. Model calls are network bound and run from a
+# single asyncio event loop with a fixed number of documents in flight.
+# Between the two, at most BIAS_BATCH_BACKLOG extracted documents wait for
+# the network stage; when it falls behind, no new extraction is started, so
+# memory stays bounded however many documents are queued.
+
+BATCH_WORKERS = int(os.getenv("BIAS_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+NETWORK_CONCURRENCY = int(os.getenv("BIAS_NETWORK_CONCURRENCY", "8"))
+BATCH_BACKLOG = int(os.getenv("BIAS_BATCH_BACKLOG", "0")) or 2 * NETWORK_CONCURRENCY
+
+# Seconds the network stage may spend on one document; 0 = no limit
+JOB_TIMEOUT = float(os.getenv("BIAS_JOB_TIMEOUT", "0"))
+
+_stores = {}
+
+
+def _store(db_path):
+    from results_store import ResultsStore
+
+    if db_path not in _stores:
+        _stores[db_path] = ResultsStore(db_path)
+    return _stores[db_path]
+
+
+def _complete(stored):
+    return bool(stored and stored["analysis"] and stored["score_html"] and stored["triggers"])
+
+
+# Runs in a pool worker: everything CPU bound for one document
+def prepare_document(path, db_path, image_dir=None, force=False):
+    import fitz  # PyMuPDF
+
+    from normalize import NORMALIZE_ENABLED, normalize_article
+    from ocr import extract_text_with_ocr
+    from models import dumps
+    from pipeline import extract_images, triaged_results
+    from results_store import document_hash
+
+    start = time.perf_counter()
+    doc_hash = document_hash(path)
+    prepared = {"path": path, "doc_hash": doc_hash, "skipped": False, "article": None, "images": [], "pages": 0,
+                "duplicate_of": None, "triaged": None, "tokens_before": 0, "tokens_after": 0}
+    stored = _store(db_path).get(doc_hash)
+    if not force and _complete(stored):
+        prepared["skipped"] = True
+        # The stored typed result crosses the process boundary encoded
+        prepared["result"] = dumps(stored["result"])
+    else:
+        # One OCR process per batch worker; the batch pool already fills the cores
+        prepared["article"] = extract_text_with_ocr(path, workers=1)
+        if NORMALIZE_ENABLED:
+            prepared["article"], report = normalize_article(prepared["article"])
+            prepared["tokens_before"], prepared["tokens_after"] = report["tokens_before"], report["tokens_after"]
+        # Local triage is CPU work too; cleared articles skip the model calls
+        prepared["triaged"] = triaged_results(prepared["article"])
+        with fitz.open(path) as doc:
+            prepared["pages"] = len(doc)
+        if image_dir:
+            output_dir = os.path.join(image_dir, doc_hash[:16])
+            os.makedirs(output_dir, exist_ok=True)
+            prepared["images"] = extract_images(path, output_dir)
+    prepared["extract_seconds"] = time.perf_counter() - start
+    return prepared
+
+
+async def _reuse_or_run(value, func, *args, **kwargs):
+    return value or await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Model calls for one extracted document; the OpenAI client is blocking, so
+# each call runs on a thread while the event loop schedules the next one
+async def analyse_document(prepared, db_path, timeout=None):
+    from openai import OpenAI
+
+    from dedup import index_document, reuse_duplicate
+    from models import ImageFinding
+    from pipeline import describe_image, run_analysis, run_triage_score, run_triggers
+
+    start = time.perf_counter()
+    token = CancelToken(timeout or None)
+    article = prepared["article"]
+    store = _store(db_path)
+    # Near-duplicates of an analysed article reuse its results, then
+    # articles cleared by triage use the local ones
+    reused = await asyncio.to_thread(reuse_duplicate, article, store, exclude_hash=prepared["doc_hash"],
+                                     token=token) or prepared["triaged"] or {}
+    prepared["duplicate_of"] = reused.get("duplicate_of")
+    prepared["triaged"] = bool(reused.get("triaged"))
+    analysis = reused.get("analysis") or await asyncio.to_thread(run_analysis, article, token=token)
+    score_html, triggers = await asyncio.gather(
+        _reuse_or_run(reused.get("score_html"), run_triage_score, analysis, article, token=token),
+        _reuse_or_run(reused.get("triggers"), run_triggers, article, analysis, token=token),
+    )
+    images = []
+    if prepared["images"]:
+        client = OpenAI()
+        summaries = await asyncio.gather(*(
+            asyncio.to_thread(describe_image, client, img_path, ext, token=token)
+            for img_path, ext, _ in prepared["images"]
+        ))
+        images = [ImageFinding(img_path, summary, page).to_record()
+                  for (img_path, _, page), summary in zip(prepared["images"], summaries)]
+    store.save(prepared["doc_hash"], path=prepared["path"], article=article, analysis=analysis,
+               score_html=score_html, triggers=triggers, images=images or None)
+    prepared["result"] = store.get_result(prepared["doc_hash"])
+    if not reused:
+        await asyncio.to_thread(index_document, prepared["doc_hash"], article, store)
+    return time.perf_counter() - start
+
+
+async def _run(paths, pool, db_path, image_dir, force, workers, concurrency, backlog, timeout, on_done):
+    from models import loads
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=backlog)
+    extracting = asyncio.Semaphore(workers)
+    results, failures = [], []
+    waited = 0.0
+
+    async def extract(path):
+        nonlocal waited
+        try:
+            prepared = await asyncio.wrap_future(pool.submit(prepare_document, path, db_path, image_dir, force))
+        except Exception as e:
+            prepared = {"path": path, "error": e}
+        # Blocks while the network stage has a full backlog; the worker's
+        # slot is only freed afterwards, so no new extraction starts meanwhile
+        wait_start = time.perf_counter()
+        await queue.put(prepared)
+        waited += time.perf_counter() - wait_start
+        extracting.release()
+
+    async def produce():
+        tasks = []
+        for path in paths:
+            await extracting.acquire()
+            tasks.append(asyncio.create_task(extract(path)))
+        await asyncio.gather(*tasks)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def consume():
+        while (prepared := await queue.get()) is not None:
+            try:
+                if "error" in prepared:
+                    raise prepared["error"]
+                prepared["network_seconds"] = 0.0
+                if not prepared["skipped"]:
+                    prepared["network_seconds"] = await analyse_document(prepared, db_path, timeout)
+            except Exception as e:
+                failures.append({"path": prepared["path"], "error": f"{type(e).__name__}: {e}"})
+                logger.warning(json.dumps({"event": "batch_failed", **failures[-1]}))
+                continue
+            # Neither the text nor the full result is kept once it is stored
+            prepared.pop("article")
+            result = prepared.pop("result")
+            result = loads(result) if prepared["skipped"] else result
+            prepared.update(score=result.score, categories=result.categories())
+            results.append(prepared)
+            if on_done:
+                await loop.run_in_executor(None, on_done, prepared)
+
+    await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    return results, failures, waited
+
+
+def run_batch(paths, workers=None, concurrency=None, backlog=None, db_path=None, image_dir=None,
+              force=False, timeout=None, on_done=None):
+    from results_store import RESULTS_DB
+
+    db_path = db_path or RESULTS_DB
+    workers = workers or BATCH_WORKERS
+    concurrency = concurrency or NETWORK_CONCURRENCY
+    backlog = backlog or BATCH_BACKLOG
+    timeout = JOB_TIMEOUT if timeout is None else timeout
+    paths = [os.path.abspath(p) for p in paths]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results, failures, waited = asyncio.run(
+            _run(paths, pool, db_path, image_dir, force, workers, concurrency, backlog, timeout, on_done))
+
+    wall = time.perf_counter() - start
+    processed = [r for r in results if not r["skipped"]]
+    pages = sum(r["pages"] for r in processed)
+    report = {
+        "workers": workers,
+        "network_concurrency": concurrency,
+        "backlog": backlog,
+        "documents": len(processed),
+        "skipped": len(results) - len(processed),
+        "near_duplicates": sum(bool(r["duplicate_of"]) for r in processed),
+        "triaged": sum(bool(r["triaged"]) for r in processed),
+        "failed": len(failures),
+        "pages": pages,
+        "wall_seconds": wall,
+        "extract_seconds": sum(r["extract_seconds"] for r in processed),
+        "network_seconds": sum(r["network_seconds"] for r in processed),
+        "backpressure_wait_seconds": waited,
+        "article_tokens_before": sum(r["tokens_before"] for r in processed),
+        "article_tokens_after": sum(r["tokens_after"] for r in processed),
+        "docs_per_second": len(processed) / wall if wall else 0.0,
+        "pages_per_second": pages / wall if wall else 0.0,
+        "failures": failures,
+    }
+    logger.info(json.dumps({"event": "batch_run", **{k: v for k, v in report.items() if k != "failures"}}))
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Analyse a corpus of PDFs: extraction across processes, "
+                                                 "model calls from one event loop")
+    parser.add_argument("files", nargs="+", help="PDF files")
+    parser.add_argument("--workers", default=str(BATCH_WORKERS),
+                        help="extraction processes; a comma-separated list (e.g. 1,2,4,8) runs the batch "
+                             "once per count and compares throughput")
+    parser.add_argument("--concurrency", type=int, default=NETWORK_CONCURRENCY,
+                        help="documents in the network stage at once")
+    parser.add_argument("--backlog", type=int, default=BATCH_BACKLOG,
+                        help="extracted documents allowed to wait for the network stage")
+    parser.add_argument("--images", metavar="DIR", help="also extract images to DIR and describe them")
+    parser.add_argument("--force", action="store_true", help="re-analyse documents already in the results store")
+    parser.add_argument("--json", dest="json_path", help="also write the throughput report(s) as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    load_dotenv()
+    worker_counts = [int(w) for w in args.workers.split(",") if w]
+    reports = []
+    for workers in worker_counts:
+        report = run_batch(
+            args.files, workers, args.concurrency, args.backlog, image_dir=args.images,
+            # Comparing core counts only makes sense if every run does the work
+            force=args.force or len(worker_counts) > 1,
+            on_done=None if len(worker_counts) > 1 else
+            lambda r: print(f"{'cached' if r['skipped'] else 'done':<7} "
+                            f"{str(r['score']) + '/10' if r['score'] is not None else '-':>5}  {r['pages']:>5}p  "
+                            f"{r['extract_seconds']:>7.2f}s cpu  {r['network_seconds']:>7.2f}s net  {r['path']}"),
+        )
+        for failure in report["failures"]:
+            print(f"FAILED  {failure['path']}: {failure['error']}")
+        reports.append(report)
+
+    print(f"{'workers':>7} {'docs':>6} {'pages':>7} {'wall s':>8} {'docs/s':>8} {'pages/s':>8} {'waited s':>9}")
+    for r in reports:
+        print(f"{r['workers']:>7} {r['documents']:>6} {r['pages']:>7} {r['wall_seconds']:>8.2f} "
+              f"{r['docs_per_second']:>8.2f} {r['pages_per_second']:>8.1f} {r['backpressure_wait_seconds']:>9.2f}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, indent=2)
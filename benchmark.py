@@ -0,0 +1,292 @@
+import argparse
+import io
+import multiprocessing
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz  # PyMuPDF
+import PIL.Image  # Pillow
+
+from concurrent.futures import ProcessPoolExecutor
+
+from fake_openai_server import start_fake_server
+
+# End-to-end benchmark of the analysis pipeline against a local fake model
+# server. Runs every stage on scan.pdf and on synthetic PDFs, and reports
+# per-stage wall time, throughput and peak memory.
+#
+#   python benchmark.py --pages 1,10,100,500 --latency 0.2 --token-delay 0.001
+#
+# --memory N compares the peak RSS of the GUI path on an N-page document
+# with the annotated view rendered in full and loaded lazily:
+#
+#   python benchmark.py --memory 1000
+
+SENTENCES = (
+    "Critics say the reckless policy will devastate working families across the region.",
+    "Officials insisted the plan was a common-sense step toward a safer future.",
+    "Residents of the capital were interviewed, while rural towns were not mentioned.",
+    "According to a single unnamed source, the decision was made behind closed doors.",
+    "The announcement drew praise from supporters and sharp criticism from opponents.",
+    "Many experts believe the numbers tell only part of the story.",
+    "The report cites one study from 2011 without describing its methods.",
+    "Local businesses are thriving, the mayor claimed during a brief press conference.",
+)
+
+# Paragraphs the annotated view loads before the user scrolls
+# (AnnotatedParagraphModel.BATCH)
+LAZY_ROWS = 50
+
+STAGES = ("extraction", "analysis", "score", "triggers", "highlights", "annotated", "export", "images")
+
+
+def _paragraph(page_number, index):
+    start = (page_number * 3 + index) % len(SENTENCES)
+    return " ".join(SENTENCES[(start + k) % len(SENTENCES)] for k in range(3))
+
+
+def _png_bytes(seed, size=(320, 200)):
+    img = PIL.Image.new("RGB", size, ((seed * 40) % 256, (seed * 90) % 256, (seed * 150) % 256))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+# Writes a deterministic PDF with a few paragraphs per page and a small
+# figure every image_every pages
+def make_synthetic_pdf(path, pages, paragraphs_per_page=4, image_every=5, scanned=False):
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        text = "\n\n".join(_paragraph(page_number, i) for i in range(paragraphs_per_page))
+        page.insert_textbox(fitz.Rect(54, 54, 558, 560), text, fontsize=11)
+        if image_every and page_number % image_every == 0:
+            page.insert_image(fitz.Rect(54, 580, 374, 780), stream=_png_bytes(page_number))
+    if scanned:
+        # Every page replaced by a full-page picture of itself, like a scanner produces
+        scan = fitz.open()
+        for page in doc:
+            scan.new_page(width=page.rect.width, height=page.rect.height).insert_image(
+                page.rect, pixmap=page.get_pixmap(dpi=100, colorspace=fitz.csGRAY))
+        doc.close()
+        doc = scan
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _measure(results, stage, func, *args):
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    value = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    results[stage] = {"seconds": elapsed, "peak_mb": (peak - baseline) / (1024 * 1024)}
+    return value
+
+
+def run_pipeline(pdf_path, stages=STAGES):
+    import pipeline
+
+    results = {}
+    text = _measure(results, "extraction", pipeline.extract_article, pdf_path)
+    analysis = ""
+    if "analysis" in stages:
+        analysis = _measure(results, "analysis", pipeline.run_analysis, text)
+    if "score" in stages:
+        _measure(results, "score", pipeline.run_score, analysis, text)
+    triggers = ""
+    if "triggers" in stages:
+        triggers = _measure(results, "triggers", pipeline.run_triggers, text, analysis)
+    if "highlights" in stages:
+        _measure(results, "highlights", lambda: [
+            pipeline.run_bias_highlight(text, category) for category in pipeline.HIGHLIGHT_STYLES
+        ])
+    if "annotated" in stages:
+        _measure(results, "annotated", pipeline.run_annotated_highlighted_article, text, triggers)
+    if "export" in stages:
+        from paragraph_index import verify_triggers
+        from pdf_export import collect_highlights, export_annotated_pdf
+        found, _ = _measure(results, "export", export_annotated_pdf, pdf_path, "annotated.pdf",
+                            collect_highlights(verify_triggers(triggers, text)[1]))
+        results["export"]["highlights"] = found
+    if "images" in stages:
+        images = _measure(results, "images", pipeline.run_image_analysis, pdf_path, os.getcwd())
+        results["images"]["count"] = len(images)
+        pipeline.cleanup_extracted_images(os.getcwd())
+    results["extraction"]["chars"] = len(text)
+    return results
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Runs in a fresh process per mode, so peak RSS isn't shared between them.
+# "full" builds the whole annotated article as one HTML string (and a
+# QTextDocument from it when PyQt5 is installed), as setHtml on the view did;
+# "lazy" keeps only the trigger matches and renders the first LAZY_ROWS
+# paragraphs, as the paragraph view does until the user scrolls
+def measure_gui_memory(pdf_path, mode):
+    import pipeline
+    from paragraph_index import matches_by_paragraph, paragraph_index, render_highlighted_html, render_paragraph_html
+
+    try:
+        from PyQt5.QtGui import QGuiApplication, QTextDocument
+    except ImportError:
+        QGuiApplication = QTextDocument = None
+
+    steps = {}
+
+    def mark(step):
+        steps[step] = {"peak_rss_mb": _max_rss_mb(), "rss_mb": _rss_mb()}
+
+    app = QGuiApplication(["benchmark", "-platform", "offscreen"]) if QGuiApplication else None
+    mark("start")
+    text = pipeline.extract_article(pdf_path)
+    mark("extraction")
+    analysis = pipeline.run_analysis(text)
+    mark("analysis")
+    triggers = pipeline.run_triggers(text, analysis)
+    mark("triggers")
+    matches, highlighted_html = pipeline.annotate_article(text, triggers)
+    if mode == "full":
+        view = render_highlighted_html(text, matches) if matches else highlighted_html
+        if QTextDocument is not None:
+            document = QTextDocument()
+            document.setHtml(view)
+            # Lay it out as the text box does when it is shown
+            document.setTextWidth(800)
+            document.size()
+    else:
+        by_paragraph = matches_by_paragraph(matches)
+        spans = paragraph_index(text).spans[:LAZY_ROWS]
+        view = [render_paragraph_html(text, span, by_paragraph.get(number, ())) for number, span in
+                enumerate(spans, start=1)]
+    mark("annotated")
+    del app
+    return {"mode": mode, "chars": len(text), "matches": len(matches), "qt": QTextDocument is not None,
+            "steps": steps}
+
+
+def run_memory_comparison(pdf_path):
+    results = []
+    for mode in ("full", "lazy"):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(measure_gui_memory, pdf_path, mode).result())
+    return results
+
+
+def _print_memory_report(report):
+    print(f"{report['pages']} pages, {report['results'][0]['chars']} characters, "
+          f"{report['results'][0]['matches']} trigger matches"
+          + ("" if report["results"][0]["qt"] else " (PyQt5 not installed: no QTextDocument in the full view)"))
+    print(f"{'mode':<6}{'step':>12}{'RSS MB':>10}{'peak MB':>10}")
+    for result in report["results"]:
+        for step, stats in result["steps"].items():
+            rss = f"{stats['rss_mb']:.1f}" if stats["rss_mb"] is not None else "-"
+            print(f"{result['mode']:<6}{step:>12}{rss:>10}{stats['peak_rss_mb']:>10.1f}")
+
+
+def _print_report(report):
+    print(f"{'document':<28}{'pages':>6}{'stage':>12}{'seconds':>10}{'pages/s':>10}{'peak MB':>10}")
+    for doc in report["documents"]:
+        for stage, stats in doc["stages"].items():
+            rate = doc["pages"] / stats["seconds"] if stats["seconds"] else float("inf")
+            print(f"{doc['name']:<28}{doc['pages']:>6}{stage:>12}{stats['seconds']:>10.3f}{rate:>10.1f}{stats['peak_mb']:>10.1f}")
+        print(f"{doc['name']:<28}{doc['pages']:>6}{'total':>12}{doc['total_seconds']:>10.3f}"
+              f"{doc['pages'] / doc['total_seconds']:>10.1f}")
+    print(f"max RSS: {report['max_rss_mb']:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bias detection pipeline")
+    parser.add_argument("--pages", default="1,10,100,500", help="comma separated synthetic page counts")
+    parser.add_argument("--scan", default="scan.pdf", help="real PDF to include (empty to skip)")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--scanned", action="store_true", help="also run image-only versions of the synthetic PDFs")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake server seconds before first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="fake server seconds per streamed token")
+    parser.add_argument("--memory", type=int, metavar="PAGES",
+                        help="only compare the GUI's peak RSS with the annotated view rendered in full and lazily, "
+                             "on a synthetic PDF of PAGES pages")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    stages = tuple(s for s in args.stages.split(",") if s)
+    page_counts = [int(p) for p in args.pages.split(",") if p]
+    scan_path = os.path.abspath(args.scan) if args.scan else None
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+
+    server = start_fake_server(latency=args.latency, token_delay=args.token_delay)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ.setdefault("BIAS_METRICS_FILE", "")
+    # Synthetic documents repeat the same sentences; a semantic cache hit
+    # would skip the model call the analysis stage is meant to time. Set
+    # before pipeline is first imported, which reads it
+    os.environ["BIAS_SEMANTIC_CACHE"] = "0"
+
+    report = {"latency": args.latency, "token_delay": args.token_delay, "documents": []}
+    cwd = os.getcwd()
+    tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            if args.memory:
+                path = make_synthetic_pdf(f"synthetic-{args.memory}.pdf", args.memory)
+                report = {"pages": args.memory, "results": run_memory_comparison(path)}
+                _print_memory_report(report)
+                return _write_report(report, json_path)
+            documents = []
+            if scan_path and os.path.exists(scan_path):
+                documents.append((os.path.basename(scan_path), scan_path))
+            for pages in page_counts:
+                documents.append((f"synthetic-{pages}p.pdf", make_synthetic_pdf(f"synthetic-{pages}.pdf", pages)))
+                if args.scanned:
+                    documents.append((f"scanned-{pages}p.pdf",
+                                      make_synthetic_pdf(f"scanned-{pages}.pdf", pages, scanned=True)))
+
+            for name, path in documents:
+                with fitz.open(path) as doc:
+                    pages = len(doc)
+                stage_results = run_pipeline(path, stages)
+                report["documents"].append({
+                    "name": name,
+                    "pages": pages,
+                    "stages": stage_results,
+                    "total_seconds": sum(s["seconds"] for s in stage_results.values()),
+                })
+    finally:
+        os.chdir(cwd)
+        tracemalloc.stop()
+        server.shutdown()
+
+    report["max_rss_mb"] = _max_rss_mb()
+    _print_report(report)
+    return _write_report(report, json_path)
+
+
+def _write_report(report, json_path):
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,97 @@
+import threading
+import time
+
+# Cancellation tokens with optional deadlines, passed down through
+# extraction, model calls and image analysis. Long steps call check()
+# between units of work (pages, images, streamed chunks); model calls also
+# register a callback that closes their response stream, so a cancelled or
+# expired call stops reading at once and the provider stops generating.
+
+
+class Cancelled(Exception):
+    pass
+
+
+class DeadlineExceeded(Cancelled):
+    pass
+
+
+class CancelToken:
+    def __init__(self, timeout=None, parent=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = min(self.deadline or parent.deadline, parent.deadline)
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._reason = None
+        self._unregister = None
+        if parent is not None:
+            self._unregister = parent.add_callback(lambda: self.cancel(parent._reason))
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    # Seconds left before the deadline, or None without one
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def cancel(self, reason="cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    # Runs callback on cancellation (immediately if already cancelled);
+    # returns a function that unregisters it
+    def add_callback(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    # Detaches a finished child from its parent, which otherwise keeps it
+    # (and its callbacks) for as long as the parent lives
+    def close(self):
+        if self._unregister is not None:
+            self._unregister()
+            self._unregister = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def error(self):
+        if self._reason == "deadline exceeded":
+            return DeadlineExceeded(self._reason)
+        return Cancelled(self._reason)
+
+    def check(self):
+        if self.cancelled:
+            raise self.error()
+
+
+def check(token):
+    if token is not None:
+        token.check()
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+logger = logging.getLogger("bias_detection.dedup")
+
+# Near-duplicate detection before any model call. Wire-service stories come
+# in many lightly edited variants; each analysed article is summarised by a
+# MinHash signature over its word 5-grams, and the signatures are indexed by
+# LSH bands in the results store. A new article whose estimated Jaccard
+# similarity to an indexed one reaches BIAS_DEDUP_THRESHOLD reuses that
+# article's results: as they are when no paragraph differs, otherwise through
+# incremental re-analysis of the paragraphs that differ. A high similarity
+# alone doesn't mean the same stance; one appended paragraph can reverse it
+# and barely move the estimate. Only articles that were analysed in full
+# are indexed, so every variant is compared with the canonical version
+# rather than with another variant.
+
+DEDUP_THRESHOLD = float(os.getenv("BIAS_DEDUP_THRESHOLD", "0.8"))  # 0 disables
+
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+# 32 bands of 4 rows: pairs from about 0.5 similarity up share a band with
+# high probability; candidates are then checked against the threshold
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(20240601)
+# a * x wraps around 2**64 before the modulo, as in common MinHash
+# implementations; small multipliers would make every permutation favour
+# the same small hash values
+_A = _rng.randint(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+_CHUNK = 4096
+
+
+def shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64))
+
+
+# NUM_PERM minimum hash values, or None for an article without words. The
+# cache only spans the lookup and indexing of the documents in flight; it
+# keeps their texts alive, so it stays small
+@lru_cache(maxsize=8)
+def minhash(text):
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(hashes), _CHUNK):
+        chunk = hashes[start:start + _CHUNK]
+        values = (_A[:, None] * chunk[None, :] + _B[:, None]) % _PRIME
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return (signature & 0xFFFFFFFF).astype(np.uint32)
+
+
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+def band_keys(signature):
+    return [f"{band}:{zlib.crc32(signature[band * ROWS:(band + 1) * ROWS].tobytes()):08x}" for band in range(BANDS)]
+
+
+# (doc_hash, similarity) of the most similar indexed article at or above the
+# threshold that has a stored analysis, or None
+def find_duplicate(text, store=None, threshold=None, exclude_hash=None):
+    from results_store import get_store
+
+    threshold = DEDUP_THRESHOLD if threshold is None else threshold
+    signature = minhash(text) if threshold else None
+    if signature is None:
+        return None
+    store = store or get_store()
+    best = None
+    for doc_hash, stored in store.signature_candidates(band_keys(signature)):
+        if doc_hash == exclude_hash:
+            continue
+        score = similarity(signature, np.frombuffer(stored, dtype=np.uint32))
+        if score >= threshold and (best is None or score > best[1]):
+            best = (doc_hash, score)
+    return best
+
+
+# Results of the canonical version adapted to this article, or None when it
+# has no near-duplicate or too much of it changed. The score is reused only
+# when no paragraph differs and left None otherwise, as are fields the
+# canonical version doesn't have yet.
+def reuse_duplicate(text, store=None, threshold=None, exclude_hash=None, token=None):
+    from incremental import reanalyze
+    from results_store import get_store
+
+    store = store or get_store()
+    match = find_duplicate(text, store, threshold, exclude_hash)
+    if match is None:
+        return None
+    doc_hash, score = match
+    canonical = store.get(doc_hash)
+    if not canonical or not canonical["analysis"] or not canonical["article"]:
+        return None
+    # The paragraph diff runs locally first; an empty one reuses everything
+    # without a model call
+    updated = reanalyze(canonical["article"], canonical["analysis"], canonical["triggers"], text, token=token,
+                        previous_phrases=[t.phrase for t in canonical["result"].triggers])
+    if updated is None:
+        return None
+    unchanged = not updated["changed"] and not updated["removed"]
+    result = {
+        "analysis": updated["analysis"],
+        "score_html": canonical["score_html"] if unchanged else None,
+        "triggers": updated["triggers"],
+        "duplicate_of": doc_hash,
+        "similarity": round(score, 4),
+    }
+    logger.info(json.dumps({
+        "event": "near_duplicate",
+        "duplicate_of": doc_hash,
+        "similarity": result["similarity"],
+        "reused": unchanged,
+        "paragraphs_changed": updated["changed"],
+    }))
+    return result
+
+
+# Adds an article analysed in full to the index
+def index_document(doc_hash, text, store=None):
+    from results_store import get_store
+
+    signature = minhash(text)
+    if signature is None or not DEDUP_THRESHOLD:
+        return
+    (store or get_store()).save_signature(doc_hash, signature.tobytes(), band_keys(signature))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find near-duplicates of text files among analysed articles")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD or 0.8)
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path, "r", encoding="utf-8") as f:
+            match = find_duplicate(f.read(), threshold=args.threshold)
+        print(f"{path}: " + (f"{match[1]:.2f} similar to {match[0][:12]}" if match else "no near-duplicate"))
@@ -0,0 +1,234 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local OpenAI-compatible /v1/chat/completions endpoint with canned,
+# deterministic answers so the pipeline can be benchmarked without the API.
+# Responses are chosen from keywords in the prompt and built from the
+# article text itself, so downstream parsing sees realistic shapes.
+
+CATEGORY_COLORS = (
+    ("Narrative Bias", "#1E90FF"),
+    ("Sentiment Bias", "#FF4500"),
+    ("Regional Bias", "#228B22"),
+    ("Slant", "#DAA520"),
+    ("Coverage Depth", "#FF8C00"),
+)
+
+
+def _prompt_text(messages):
+    parts = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if p.get("type") == "text")
+        else:
+            parts.append(content)
+    return "\n".join(parts)
+
+
+def _has_image(messages):
+    return any(
+        isinstance(m.get("content"), list) and any(p.get("type") == "image_url" for p in m["content"])
+        for m in messages
+    )
+
+
+def _article(messages, prompt):
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str) and content.startswith("Article:\n"):
+            return content[len("Article:\n"):]
+    for marker in ("Article:\n", "From this article:\n", "Input:\n"):
+        if marker in prompt:
+            return prompt.rsplit(marker, 1)[1]
+    return prompt
+
+
+def _paragraphs(text):
+    return [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+
+
+def _phrases(text, count):
+    phrases = []
+    for paragraph in _paragraphs(text):
+        sentence = re.split(r"(?<=[.!?])\s", " ".join(paragraph.split()))[0]
+        if len(sentence.split()) >= 4:
+            phrases.append(sentence)
+        if len(phrases) == count:
+            break
+    return phrases
+
+
+def fake_reply(messages):
+    prompt = _prompt_text(messages)
+    if _has_image(messages):
+        return "The image reinforces the article's framing by showing a single perspective on the topic."
+
+    article = _article(messages, prompt)
+    if "bias score" in prompt:
+        score = len(article) % 10 + 1
+        return (
+            f"<p><b>Score:</b> {score}/10</p>\n"
+            "<p>The article relies on emotionally charged wording and a single viewpoint.</p>"
+        )
+    if "trigger phrases" in prompt and "paragraph number" in prompt:
+        lines = []
+        for i, phrase in enumerate(_phrases(article, 3), start=1):
+            lines.append(f"<p><b>Trigger Phrase:</b> '{phrase}'<br><b>Paragraph:</b> {i}</p>")
+        return "\n".join(lines)
+    if "Highlight" in prompt:
+        paragraphs = "\n\n".join(f"<p>{p}</p>" for p in _paragraphs(article))
+        if "Explanation" in prompt:
+            explanations = "\n\n".join(
+                f"<p><b>{p}</b>: explanation of the highlighted bias.</p>" for p in _phrases(article, 2)
+            )
+            return f"{paragraphs}\n\n\n{explanations}"
+        return paragraphs
+    if "Reformat the output" in prompt:
+        return "<p><b>Phrase:</b> explanation of the highlighted bias.</p>"
+    analysis = "\n".join(
+        f"<p><b><span style='color:{color};'>{name}:</span></b> The article shows signs of {name.lower()}.</p>"
+        for name, color in CATEGORY_COLORS
+    )
+    if "confidence" in prompt:
+        analysis += f"\n<!-- confidence: {len(article) % 5 + 5}/10 -->"
+    return analysis
+
+
+def _usage(prompt_tokens, completion_tokens, cached_tokens=0):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+# Mimics provider prompt caching: a repeated prefix of every message but the
+# last is reported as cached once it reaches 1024 tokens, in 128-token steps
+def _cached_tokens(server, messages):
+    prefix = _prompt_text(messages[:-1])
+    prefix_tokens = len(prefix) // 4
+    if prefix_tokens < 1024:
+        return 0
+    with server.lock:
+        seen = prefix in server.prefixes
+        server.prefixes.add(prefix)
+    return (prefix_tokens // 128) * 128 if seen else 0
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages", [])
+        model = request.get("model", "gpt-4o-mini")
+
+        reply = fake_reply(messages)
+        words = re.findall(r"\S+\s*", reply) or [reply]
+        max_tokens = request.get("max_tokens")
+        if max_tokens:
+            words = words[:max_tokens]
+        usage = _usage(len(_prompt_text(messages)) // 4, len(words), _cached_tokens(self.server, messages))
+
+        settings = self.server.settings
+        time.sleep(settings["latency"])
+
+        if request.get("stream"):
+            try:
+                self._stream(model, words, usage, request)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client cancelled the stream
+        else:
+            time.sleep(len(words) * settings["token_delay"])
+            self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, model, words, usage, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, chunk_usage=None):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                "usage": chunk_usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        token_delay = self.server.settings["token_delay"]
+        for word in words:
+            event([{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+            time.sleep(token_delay)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Starts the server on a daemon thread; port 0 picks a free port.
+# Point the client at it with OPENAI_BASE_URL=http://host:port/v1
+def start_fake_server(port=0, host="127.0.0.1", latency=0.0, token_delay=0.0):
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.settings = {"latency": latency, "token_delay": token_delay}
+    server.prefixes = set()
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.port, latency=args.latency, token_delay=args.token_delay)
+    print(f"Fake OpenAI server listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
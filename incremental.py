@@ -0,0 +1,109 @@
+import difflib
+import json
+import logging
+import os
+
+from instrumentation import record_cache_hit
+from lexicon import paragraph_spans
+from paragraph_index import (
+    paragraph_index, parse_trigger_phrases, parse_highlighted_phrases, format_trigger_html, render_highlighted_html,
+)
+from pipeline import HIGHLIGHT_STYLES, run_analysis_update, run_triggers, split_highlight_output
+
+logger = logging.getLogger("bias_detection.incremental")
+
+# Re-analysis of an edited article. Paragraphs are diffed against the
+# previous version; only edited or added paragraphs go to the model, and
+# findings tied to unchanged paragraphs are carried over. When more than
+# REANALYZE_MAX_CHANGED of the new version's paragraphs are new or edited,
+# an update to the old analysis would mostly describe the old article, so
+# reanalyze returns None and the caller analyses it in full.
+
+MAX_TRIGGERS = 3
+REANALYZE_MAX_CHANGED = float(os.getenv("BIAS_REANALYZE_MAX_CHANGED", "0.5"))
+
+
+def split_paragraphs(text):
+    return [text[start:end].strip() for start, end in paragraph_spans(text)]
+
+
+def _key(paragraph):
+    return " ".join(paragraph.split())
+
+
+# Returns (changed, removed): paragraphs of the new version that are new or
+# edited, and paragraphs of the old version that no longer exist
+def diff_paragraphs(old_text, new_text):
+    old = split_paragraphs(old_text)
+    new = split_paragraphs(new_text)
+    matcher = difflib.SequenceMatcher(None, [_key(p) for p in old], [_key(p) for p in new], autojunk=False)
+    changed, removed = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed.extend(old[i1:i2])
+        changed.extend(new[j1:j2])
+    return changed, removed
+
+
+# previous_phrases are the trigger phrases of the previous version's stored
+# result; the previous trigger HTML is only parsed without them
+def reanalyze(previous_article, previous_analysis, previous_triggers, new_text, token=None, previous_phrases=None):
+    changed, removed = diff_paragraphs(previous_article, new_text)
+    if not changed and not removed:
+        record_cache_hit("run_analysis")
+        return {"analysis": previous_analysis, "triggers": previous_triggers, "changed": 0, "removed": 0}
+    total = len(split_paragraphs(new_text))
+    if total and len(changed) / total > REANALYZE_MAX_CHANGED:
+        logger.info(json.dumps({
+            "event": "incremental_skipped",
+            "paragraphs_changed": len(changed),
+            "paragraphs_total": total,
+        }))
+        return None
+
+    changed_text = "\n\n".join(changed)
+    analysis = run_analysis_update(previous_analysis, changed_text or "(no new paragraphs)", "\n\n".join(removed),
+                                   token=token)
+
+    # Previous trigger phrases that still occur keep their place; new phrases
+    # are only looked for in the changed paragraphs
+    index = paragraph_index(new_text)
+    if previous_phrases is None:
+        previous_phrases = parse_trigger_phrases(previous_triggers or "")
+    kept = index.locate_all(previous_phrases)
+    found = []
+    if changed_text:
+        found = index.locate_all(parse_trigger_phrases(run_triggers(changed_text, analysis, token=token)))
+    merged = []
+    seen = set()
+    for match in found + kept:
+        if match.start not in seen:
+            seen.add(match.start)
+            merged.append(match)
+    merged = sorted(merged[:MAX_TRIGGERS], key=lambda m: m.start)
+    triggers = format_trigger_html(merged) if merged else "<p>No trigger phrases could be verified in the article.</p>"
+
+    logger.info(json.dumps({
+        "event": "incremental_reanalysis",
+        "paragraphs_changed": len(changed),
+        "paragraphs_removed": len(removed),
+        "triggers_kept": len([m for m in merged if m in kept]),
+    }))
+    return {"analysis": analysis, "triggers": triggers, "changed": len(changed), "removed": len(removed)}
+
+
+# Re-renders a previous highlighter result onto the edited article when all
+# of its highlighted phrases are still present; None means it must be rerun
+def update_highlight(previous_html, new_text, category):
+    article_html, explanation_html = split_highlight_output(previous_html)
+    phrases = parse_highlighted_phrases(article_html)
+    if not phrases:
+        return None
+    matches = paragraph_index(new_text).locate_all(phrases)
+    if len(matches) < len(phrases):
+        return None
+    color = HIGHLIGHT_STYLES[category][0]
+    body = render_highlighted_html(new_text, matches, style=f"color:{color}; font-weight:bold;")
+    record_cache_hit(category.replace(" ", "_") + "_highlight")
+    return body + "\n\n" + explanation_html
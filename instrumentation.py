@@ -0,0 +1,300 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from cancellation import Cancelled
+
+logger = logging.getLogger("bias_detection.metrics")
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# upper bounds (seconds) of the wall time histogram
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60)
+
+METRICS_FILE = os.getenv("BIAS_METRICS_FILE", "metrics.prom")
+
+_lock = threading.Lock()
+# Concurrent steps (queue workers, batch runs) share one temporary file
+_write_lock = threading.Lock()
+_series = {}
+_local_cache_hits = {}
+_routes = {}
+_semantic = {"hit": 0, "miss": 0, "saved_tokens": 0, "saved_cost": 0.0}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    input_price, cached_price, output_price = prices
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+# Drop-in replacement for client.chat.completions.create that records timings,
+# token usage and cost for one named pipeline step. The call is streamed so
+# time-to-first-token can be measured; the returned object exposes the same
+# chat.choices[0].message.content / chat.usage shape as a normal completion.
+# With a cancellation token the request times out at its deadline and the
+# stream is closed as soon as the token is cancelled.
+def chat_completion(client, step, token=None, **kwargs):
+    model = kwargs.get("model", "")
+    start = time.perf_counter()
+    first_token_at = None
+    parts = []
+    usage = None
+    unregister = None
+    try:
+        if token is not None:
+            token.check()
+            if token.deadline is not None:
+                # the deadline bounds the whole call, so no client-side retries
+                client = client.with_options(max_retries=0)
+                kwargs.setdefault("timeout", max(token.remaining(), 0.001))
+        stream = client.chat.completions.create(
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs,
+        )
+        if token is not None:
+            unregister = token.add_callback(stream.close)
+        for chunk in stream:
+            if token is not None:
+                token.check()
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(delta)
+        if token is not None:
+            token.check()
+    except Exception as e:
+        if token is not None and token.cancelled and not isinstance(e, Cancelled):
+            # the stream was closed from another thread; report the cancellation
+            error = token.error()
+            record_error(step, model, time.perf_counter() - start, error)
+            raise error from e
+        record_error(step, model, time.perf_counter() - start, e)
+        raise
+    finally:
+        if unregister is not None:
+            unregister()
+
+    wall = time.perf_counter() - start
+    ttft = (first_token_at - start) if first_token_at is not None else wall
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    record_call(step, model, wall, ttft, prompt_tokens, completion_tokens, cached_tokens)
+
+    message = SimpleNamespace(content="".join(parts))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _series_for(step, model):
+    key = (step, model)
+    if key not in _series:
+        _series[key] = {
+            "calls": 0,
+            "errors": 0,
+            "wall_sum": 0.0,
+            "ttft_sum": 0.0,
+            "buckets": [0] * len(LATENCY_BUCKETS),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "cache_hits": 0,
+            "cost": 0.0,
+        }
+    return _series[key]
+
+
+def record_call(step, model, wall, ttft, prompt_tokens, completion_tokens, cached_tokens=0):
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+    with _lock:
+        s = _series_for(step, model)
+        s["calls"] += 1
+        s["wall_sum"] += wall
+        s["ttft_sum"] += ttft
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if wall <= bound:
+                s["buckets"][i] += 1
+        s["prompt_tokens"] += prompt_tokens
+        s["completion_tokens"] += completion_tokens
+        s["cached_tokens"] += cached_tokens
+        if cached_tokens:
+            s["cache_hits"] += 1
+        s["cost"] += cost
+
+    logger.info(json.dumps({
+        "event": "model_call",
+        "step": step,
+        "model": model,
+        "wall_s": round(wall, 4),
+        "ttft_s": round(ttft, 4),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_ratio": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+        "cost_usd": round(cost, 6),
+    }))
+    write_metrics()
+
+
+def record_error(step, model, wall, error):
+    with _lock:
+        _series_for(step, model)["errors"] += 1
+    logger.warning(json.dumps({
+        "event": "model_call_error",
+        "step": step,
+        "model": model,
+        "wall_s": round(wall, 4),
+        "error": type(error).__name__,
+    }))
+    write_metrics()
+
+
+# For steps answered from a local cache without any model call
+def record_cache_hit(step):
+    with _lock:
+        _local_cache_hits[step] = _local_cache_hits.get(step, 0) + 1
+    logger.info(json.dumps({"event": "local_cache_hit", "step": step}))
+
+
+# Wall time of a routed step, including local answers and escalations
+def record_route(step, route, wall):
+    with _lock:
+        calls, total = _routes.get((step, route), (0, 0.0))
+        _routes[(step, route)] = (calls + 1, total + wall)
+    logger.info(json.dumps({"event": "route", "step": step, "route": route, "wall_s": round(wall, 4)}))
+    write_metrics()
+
+
+# Semantic cache lookups for run_analysis and the estimated calls they saved
+def record_semantic_lookup(hit, saved_tokens=0, saved_cost=0.0):
+    with _lock:
+        _semantic["hit" if hit else "miss"] += 1
+        _semantic["saved_tokens"] += saved_tokens
+        _semantic["saved_cost"] += saved_cost
+    write_metrics()
+
+
+def _labels(step, model):
+    return f'step="{step}",model="{model}"'
+
+
+def render_metrics():
+    lines = []
+
+    def metric(name, kind, help_text, values):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(values)
+
+    with _lock:
+        series = sorted(_series.items())
+        local_hits = sorted(_local_cache_hits.items())
+        routes = sorted(_routes.items())
+        semantic = dict(_semantic)
+
+        metric("bias_model_calls_total", "counter", "Completed model calls.",
+               [f"bias_model_calls_total{{{_labels(*k)}}} {s['calls']}" for k, s in series])
+        metric("bias_model_errors_total", "counter", "Failed model calls.",
+               [f"bias_model_errors_total{{{_labels(*k)}}} {s['errors']}" for k, s in series])
+
+        histogram = []
+        for k, s in series:
+            for bound, count in zip(LATENCY_BUCKETS, s["buckets"]):
+                histogram.append(f'bias_model_call_seconds_bucket{{{_labels(*k)},le="{bound}"}} {count}')
+            histogram.append(f'bias_model_call_seconds_bucket{{{_labels(*k)},le="+Inf"}} {s["calls"]}')
+            histogram.append(f"bias_model_call_seconds_sum{{{_labels(*k)}}} {s['wall_sum']:.6f}")
+            histogram.append(f"bias_model_call_seconds_count{{{_labels(*k)}}} {s['calls']}")
+        metric("bias_model_call_seconds", "histogram", "Wall time of model calls.", histogram)
+
+        metric("bias_model_ttft_seconds_sum", "counter", "Summed time to first token.",
+               [f"bias_model_ttft_seconds_sum{{{_labels(*k)}}} {s['ttft_sum']:.6f}" for k, s in series])
+        metric("bias_model_prompt_tokens_total", "counter", "Prompt tokens sent.",
+               [f"bias_model_prompt_tokens_total{{{_labels(*k)}}} {s['prompt_tokens']}" for k, s in series])
+        metric("bias_model_completion_tokens_total", "counter", "Completion tokens received.",
+               [f"bias_model_completion_tokens_total{{{_labels(*k)}}} {s['completion_tokens']}" for k, s in series])
+        metric("bias_model_cached_tokens_total", "counter", "Prompt tokens served from the provider cache.",
+               [f"bias_model_cached_tokens_total{{{_labels(*k)}}} {s['cached_tokens']}" for k, s in series])
+        metric("bias_model_cache_hits_total", "counter", "Calls with at least one cached prompt token.",
+               [f"bias_model_cache_hits_total{{{_labels(*k)}}} {s['cache_hits']}" for k, s in series])
+        metric("bias_model_cost_usd_total", "counter", "Estimated spend in USD.",
+               [f"bias_model_cost_usd_total{{{_labels(*k)}}} {s['cost']:.6f}" for k, s in series])
+        metric("bias_local_cache_hits_total", "counter", "Steps answered locally without a model call.",
+               [f'bias_local_cache_hits_total{{step="{step}"}} {n}' for step, n in local_hits])
+        metric("bias_route_calls_total", "counter", "Routed steps by route.",
+               [f'bias_route_calls_total{{step="{step}",route="{route}"}} {calls}'
+                for (step, route), (calls, _) in routes])
+        metric("bias_route_seconds_sum", "counter", "Summed wall time of routed steps by route.",
+               [f'bias_route_seconds_sum{{step="{step}",route="{route}"}} {total:.6f}'
+                for (step, route), (_, total) in routes])
+        metric("bias_semantic_cache_lookups_total", "counter", "Semantic cache lookups by result.",
+               [f'bias_semantic_cache_lookups_total{{result="{r}"}} {semantic[r]}' for r in ("hit", "miss")])
+        metric("bias_semantic_cache_saved_tokens_total", "counter", "Estimated tokens saved by semantic cache hits.",
+               [f"bias_semantic_cache_saved_tokens_total {semantic['saved_tokens']}"])
+        metric("bias_semantic_cache_saved_usd_total", "counter", "Estimated spend saved by semantic cache hits.",
+               [f"bias_semantic_cache_saved_usd_total {semantic['saved_cost']:.6f}"])
+
+    return "\n".join(lines) + "\n"
+
+
+# One process writes a metrics file: the totals are this process's own, so
+# another writer would replace them with its own. Pool workers (batch
+# extraction, batch export) therefore don't write; their events are only in
+# the JSON log. Separate runs at the same time each need their own
+# BIAS_METRICS_FILE. The temporary file is per process, so even then a
+# reader only ever sees one complete file.
+def write_metrics(path=None):
+    path = path or METRICS_FILE
+    if not path or multiprocessing.parent_process() is not None:
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with _write_lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(render_metrics())
+            os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics file {path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Serves the metrics at http://host:port/metrics from a daemon thread
+def start_metrics_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,207 @@
+import gzip
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelToken
+
+logger = logging.getLogger("bias_detection.jsonl")
+
+# Streaming analysis of article dumps in JSONL/NDJSON: one JSON object per
+# line holding the article text. Lines are read one at a time, the text goes
+# straight to the analysis steps (no PDF extraction), and each result is
+# written as one JSONL line as soon as it and every line before it are done.
+# Only a fixed window of articles is in memory at once, whatever the size of
+# the input; results are also stored keyed by the hash of the text, so a
+# re-run answers repeated or already analysed articles from the store.
+
+JSONL_WORKERS = int(os.getenv("BIAS_JSONL_WORKERS", "4"))
+TEXT_FIELDS = ("text", "article", "content", "body")
+ID_FIELDS = ("id", "doc_id", "url")
+
+# Seconds one article may take before its calls are cancelled; 0 = no limit
+JOB_TIMEOUT = float(os.getenv("BIAS_JOB_TIMEOUT", "0"))
+
+
+def _open(path, mode):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _field(record, names):
+    for name in names:
+        if record.get(name) not in (None, ""):
+            return record[name]
+    return None
+
+
+# Yields (line number, id, text or None, error or None) without reading ahead
+def read_articles(path, text_field=None, id_field=None):
+    text_fields = (text_field,) if text_field else TEXT_FIELDS
+    id_fields = (id_field,) if id_field else ID_FIELDS
+    f = _open(path, "r")
+    try:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, None, "not a JSON object"
+                continue
+            article_id = _field(record, id_fields)
+            text = _field(record, text_fields)
+            if not isinstance(text, str):
+                yield line_number, article_id, None, "no article text"
+                continue
+            yield line_number, article_id, text, None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def analyse_text(text, source=None, store=None, token=None):
+    from dedup import index_document, reuse_duplicate
+    from pipeline import run_analysis, run_triage_score, run_triggers, triaged_results
+    from results_store import build_result, text_hash
+
+    doc_hash = text_hash(text)
+    result = {"doc_hash": doc_hash, "cached": False, "duplicate_of": None, "triaged": False}
+    stored = store.get(doc_hash) if store is not None else None
+    if stored and stored["analysis"] and stored["score_html"] and stored["triggers"]:
+        result.update(analysis=stored["analysis"], score_html=stored["score_html"], triggers=stored["triggers"],
+                      result=stored["result"], cached=True)
+        return result
+    reused = (reuse_duplicate(text, store, token=token) if store is not None else None) or triaged_results(text)
+    if reused:
+        result.update(reused)
+    else:
+        result["analysis"] = run_analysis(text, token=token)
+    if not result.get("score_html"):
+        result["score_html"] = run_triage_score(result["analysis"], text, token=token)
+    if not result.get("triggers"):
+        result["triggers"] = run_triggers(text, result["analysis"], token=token)
+    if store is not None:
+        store.save(doc_hash, path=source, article=text, analysis=result["analysis"],
+                   score_html=result["score_html"], triggers=result["triggers"])
+        if not reused:
+            index_document(doc_hash, text, store)
+        result["result"] = store.get_result(doc_hash)
+    else:
+        result["result"] = build_result({"doc_hash": doc_hash, "article": text, **result})
+    return result
+
+
+def _result(line_number, article_id, future, error):
+    result = {"line": line_number, "id": article_id}
+    if error is None:
+        try:
+            analysed = future.result()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            typed = analysed.pop("result")
+            result.update(analysed)
+            result.update(score=typed.score, categories=typed.categories(),
+                          trigger_phrases=[t.to_record() for t in typed.triggers])
+    if error is not None:
+        result["error"] = error
+        logger.warning(json.dumps({"event": "jsonl_failed", "line": line_number, "id": article_id, "error": error}))
+    return result
+
+
+# Results are written in input order; at most 2 x workers articles are held
+# (queued or running) at any time, so memory doesn't grow with the input
+def ingest(input_path, output_path, workers=None, text_field=None, id_field=None, use_store=True,
+           timeout=None, on_result=None):
+    from results_store import get_store
+
+    workers = workers or JSONL_WORKERS
+    timeout = JOB_TIMEOUT if timeout is None else timeout
+    store = get_store() if use_store else None
+    source = None if input_path == "-" else os.path.abspath(input_path)
+    run_token = CancelToken()
+    window = deque()
+    counts = {"articles": 0, "failed": 0, "cached": 0, "near_duplicates": 0, "triaged": 0}
+    start = time.perf_counter()
+
+    def write_oldest(out):
+        result = _result(*window.popleft())
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        counts["articles"] += 1
+        counts["failed"] += "error" in result
+        counts["cached"] += bool(result.get("cached"))
+        counts["near_duplicates"] += bool(result.get("duplicate_of"))
+        counts["triaged"] += bool(result.get("triaged"))
+        if on_result:
+            on_result(result)
+
+    out = _open(output_path, "w")
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bias-jsonl")
+    try:
+        for line_number, article_id, text, error in read_articles(input_path, text_field, id_field):
+            future = None
+            if error is None:
+                token = CancelToken(timeout or None, parent=run_token)
+                future = pool.submit(analyse_text, text, f"{source}#{article_id or line_number}" if source else None,
+                                     store, token)
+                future.add_done_callback(lambda _, token=token: token.close())
+            window.append((line_number, article_id, future, error))
+            while len(window) >= 2 * workers:
+                write_oldest(out)
+        while window:
+            write_oldest(out)
+    except KeyboardInterrupt:
+        run_token.cancel()
+        raise
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if out is not sys.stdout:
+            out.close()
+
+    wall = time.perf_counter() - start
+    report = {
+        "workers": workers,
+        **counts,
+        "wall_seconds": wall,
+        "articles_per_second": counts["articles"] / wall if wall else 0.0,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    logger.info(json.dumps({"event": "jsonl_ingest", **report}))
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Analyse articles from a JSONL/NDJSON dump and stream results as JSONL")
+    parser.add_argument("input", help="JSONL file (.gz accepted), or - for stdin")
+    parser.add_argument("output", help="results JSONL file, or - for stdout")
+    parser.add_argument("--workers", type=int, default=JSONL_WORKERS, help="articles analysed at once")
+    parser.add_argument("--text-field", help=f"field holding the article (default: first of {', '.join(TEXT_FIELDS)})")
+    parser.add_argument("--id-field", help=f"field identifying the article (default: first of {', '.join(ID_FIELDS)})")
+    parser.add_argument("--no-store", action="store_true", help="don't read or write the results store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stderr)
+    load_dotenv()
+    report = ingest(args.input, args.output, args.workers, args.text_field, args.id_field, not args.no_store)
+    print(f"{report['articles']} articles ({report['cached']} from the store, "
+          f"{report['near_duplicates']} near-duplicates, {report['triaged']} triaged, {report['failed']} failed) "
+          f"in {report['wall_seconds']:.2f}s: {report['articles_per_second']:.2f} articles/s, "
+          f"peak RSS {report['max_rss_mb']:.0f} MB", file=sys.stderr)
@@ -0,0 +1,120 @@
+import bisect
+import json
+import logging
+import re
+
+logger = logging.getLogger("bias_detection.lexicon")
+
+# Loaded-language lexicon used to rank paragraphs before any model call.
+# Weights reflect how strongly a term tends to signal each bias category.
+LEXICON = {
+    "sentiment": (2.0, (
+        "devastating", "devastate", "disastrous", "disaster", "catastrophe", "catastrophic",
+        "shocking", "outrageous", "horrific", "horrible", "terrible", "appalling", "alarming",
+        "brilliant", "amazing", "incredible", "heroic", "tragic", "toxic", "dangerous",
+        "reckless", "harmful", "unhealthy", "addiction", "addicted", "addictive", "invasion",
+        "crisis", "chaos", "nightmare", "slams", "blasts", "destroys", "mindless", "thriving",
+    )),
+    "slant": (2.5, (
+        "radical", "extremist", "far-left", "far-right", "regime", "propaganda", "elites",
+        "so-called", "common-sense", "common sense", "patriots", "socialist", "woke",
+        "corrupt", "cabal", "agenda", "mainstream media", "fake news", "bureaucrats",
+        "job-killing", "taxpayer-funded", "illegal aliens", "freedom fighters",
+    )),
+    "narrative": (1.5, (
+        "us vs. them", "they always", "they never", "the truth is", "make no mistake",
+        "invasion", "war on", "fight against", "battle", "victims", "villains", "silenced",
+        "wake up", "everyone knows", "no one", "only", "clearly", "obviously",
+    )),
+    "coverage": (1.0, (
+        "sources say", "according to a source", "unnamed source", "some say", "critics say",
+        "many believe", "experts believe", "it is believed", "reportedly", "allegedly",
+        "claimed", "insisted", "argues", "probably",
+    )),
+    "intensity": (1.0, (
+        "always", "never", "every", "all", "totally", "completely", "absolutely", "extremely",
+        "very", "so much", "far too", "huge", "massive",
+    )),
+}
+
+
+def _compile():
+    weights = {}
+    for weight, terms in LEXICON.values():
+        for term in terms:
+            weights[term.lower()] = max(weight, weights.get(term.lower(), 0))
+    alternation = "|".join(re.escape(t) for t in sorted(weights, key=len, reverse=True))
+    return re.compile(r"(?<![\w-])(?:" + alternation + r")(?![\w-])|!", re.IGNORECASE), weights
+
+
+_PATTERN, _TERM_WEIGHTS = _compile()
+_EXCLAMATION_WEIGHT = 1.5
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+# Returns (start, end) character offsets of every non-empty paragraph
+def paragraph_spans(text):
+    spans = []
+    start = 0
+    for match in _PARAGRAPH_BREAK.finditer(text):
+        if text[start:match.start()].strip():
+            spans.append((start, match.start()))
+        start = match.end()
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+# Scores every paragraph in a single regex pass over the whole text. Each
+# match is binned into its paragraph by offset, and totals are normalised
+# by paragraph length so long neutral paragraphs don't outrank short loaded ones.
+def score_paragraphs(text, spans=None):
+    spans = spans if spans is not None else paragraph_spans(text)
+    starts = [start for start, _ in spans]
+    totals = [0.0] * len(spans)
+    for match in _PATTERN.finditer(text):
+        index = bisect.bisect_right(starts, match.start()) - 1
+        if index < 0 or match.start() >= spans[index][1]:
+            continue
+        term = match.group(0).lower()
+        totals[index] += _EXCLAMATION_WEIGHT if term == "!" else _TERM_WEIGHTS[term]
+    scores = []
+    for (start, end), total in zip(spans, totals):
+        words = text.count(" ", start, end) + 1
+        scores.append(total / (words ** 0.5))
+    return scores
+
+
+# Numbers (from 1, in article order) of the top_n most suspicious
+# paragraphs, so prompts can point the model at them. Short documents, and
+# top_n <= 0, return None: every paragraph is relevant.
+def suspicious_paragraphs(text, top_n):
+    spans = paragraph_spans(text)
+    if top_n <= 0 or len(spans) <= top_n:
+        return None
+    scores = score_paragraphs(text, spans)
+    ranked = sorted(range(len(spans)), key=lambda i: (-scores[i], i))
+    keep = sorted(ranked[:top_n])
+    logger.info(json.dumps({
+        "event": "prefilter",
+        "paragraphs_total": len(spans),
+        "paragraphs_kept": len(keep),
+        "chars_total": len(text),
+        "chars_kept": sum(spans[i][1] - spans[i][0] for i in keep),
+    }))
+    return [i + 1 for i in keep]
+
+
+# Most frequent lexicon terms in the text, e.g. for explaining a local score
+def top_terms(text, n=3):
+    counts = {}
+    for match in _PATTERN.finditer(text):
+        term = match.group(0).lower()
+        if term != "!":
+            counts[term] = counts.get(term, 0) + 1
+    return sorted(counts, key=lambda t: (-counts[t] * _TERM_WEIGHTS[t], t))[:n]
+
+
+def term_weights():
+    return dict(_TERM_WEIGHTS)
@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from lexicon import term_weights, top_terms
+
+# CPU-only approximate bias scorer: a linear model over hashed unigram and
+# bigram features. With no trained weights it falls back to weights seeded
+# from the lexicon, so it works out of the box; train() fits it to scores
+# produced by the LLM path.
+
+N_FEATURES = 2 ** 18
+MODEL_PATH = os.getenv("BIAS_CLASSIFIER_MODEL", "bias_classifier.npz")
+
+_TOKEN = re.compile(r"[a-z0-9']+(?:-[a-z0-9']+)*")
+
+
+def _hash(token):
+    return zlib.crc32(token.encode("utf-8")) % N_FEATURES
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+# Hashed unigram + bigram counts as (indices, values), L2-normalised
+def featurize(text):
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    hashed = np.fromiter((_hash(g) for g in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    values = np.log1p(counts).astype(np.float32)
+    values /= np.linalg.norm(values)
+    return indices, values
+
+
+class LocalBiasClassifier:
+    def __init__(self, weights=None, bias=None):
+        if weights is None:
+            weights, bias = self.seed_weights()
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+
+    # Lexicon terms get positive weight; everything else starts at zero
+    @staticmethod
+    def seed_weights():
+        weights = np.zeros(N_FEATURES, dtype=np.float32)
+        for term, weight in term_weights().items():
+            weights[_hash(" ".join(tokenize(term)))] += 2 * weight
+        return weights, -2.0
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or MODEL_PATH
+        if path and os.path.exists(path):
+            data = np.load(path)
+            return cls(data["weights"], float(data["bias"]))
+        return cls()
+
+    def save(self, path=None):
+        np.savez_compressed(path or MODEL_PATH, weights=self.weights, bias=np.float32(self.bias))
+
+    def decision(self, text):
+        indices, values = featurize(text)
+        return float(values @ self.weights[indices]) + self.bias
+
+    # Score on the same 1-10 scale as run_score
+    def score(self, text):
+        probability = 1.0 / (1.0 + np.exp(-self.decision(text)))
+        return int(round(1 + 9 * probability))
+
+    # Fits the weights to (text, score) pairs with plain SGD on squared error
+    # of the 0-1 target; only touched features are updated
+    def train(self, texts, scores, epochs=5, learning_rate=0.5, l2=1e-4):
+        samples = [(featurize(t), (s - 1) / 9.0) for t, s in zip(texts, scores)]
+        for _ in range(epochs):
+            for (indices, values), target in samples:
+                z = float(values @ self.weights[indices]) + self.bias
+                prediction = 1.0 / (1.0 + np.exp(-z))
+                gradient = (prediction - target) * prediction * (1 - prediction)
+                self.weights[indices] -= learning_rate * (gradient * values + l2 * self.weights[indices])
+                self.bias -= learning_rate * gradient
+        return self
+
+
+_classifier = None
+
+
+def get_classifier():
+    global _classifier
+    if _classifier is None:
+        _classifier = LocalBiasClassifier.load()
+    return _classifier
+
+
+# Same HTML shape as run_score, computed locally in milliseconds
+def run_fast_score(file_content, score=None):
+    score = get_classifier().score(file_content) if score is None else score
+    color = "red" if score >= 5 else "green"
+    terms = top_terms(file_content)
+    if terms:
+        summary = "Approximate local score. Most loaded terms found: " + ", ".join(f"'{t}'" for t in terms) + "."
+    else:
+        summary = "Approximate local score. No strongly loaded language was found."
+    return f"<p><b>Score:</b> <span style='color:{color};'>{score}/10</span></p>\n<p>{summary}</p>"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fast local bias triage for text or PDF files")
+    parser.add_argument("files", nargs="*", help="PDF or text files to score")
+    parser.add_argument("--threshold", type=int, default=5, help="scores at or above this need the LLM path")
+    parser.add_argument("--train", metavar="JSONL", help='train from lines of {"text": ..., "score": N}')
+    args = parser.parse_args()
+
+    if args.train:
+        texts, scores = [], []
+        with open(args.train, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    texts.append(record["text"])
+                    scores.append(record["score"])
+        LocalBiasClassifier().train(texts, scores).save()
+        print(f"Trained on {len(texts)} articles, saved to {MODEL_PATH}")
+
+    classifier = get_classifier()
+    for path in args.files:
+        if path.lower().endswith(".pdf"):
+            from pipeline import extract_article
+            text = extract_article(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        score = classifier.score(text)
+        route = "llm" if score >= args.threshold else "skip"
+        print(f"{score:>2}/10  {route:<4}  {path}")
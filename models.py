@@ -0,0 +1,145 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:  # optional; JSON is used without it
+    msgpack = None
+
+# Typed results of one document. The model returns HTML; it is parsed once
+# into these slotted dataclasses, which hold only the fields (no per-instance
+# __dict__), instead of every consumer re-parsing the HTML. The results
+# store keeps each document's DocumentResult encoded next to the HTML, and
+# the queue, batch runner, JSONL ingest and exports read it from there.
+
+_HEADER = r"(?:<p[^>]*>\s*)?<b>\s*<span style=['\"]color:\s*([^;'\"]+);?['\"]>\s*([^<:]+?)\s*:?\s*</span>\s*:?\s*</b>"
+_FINDING = re.compile(
+    _HEADER + r"\s*:?\s*(.*?)\s*(?:</p>|(?=" + _HEADER + r")|<!--|\Z)",
+    re.IGNORECASE | re.DOTALL,
+)
+_CONFIDENCE = re.compile(r"<!--\s*confidence:\s*(\d+)", re.IGNORECASE)
+
+
+@dataclass(slots=True, frozen=True)
+class TriggerPhrase:
+    phrase: str
+    paragraph: int
+    start: int
+    end: int
+
+    def to_record(self):
+        return [self.phrase, self.paragraph, self.start, self.end]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+
+@dataclass(slots=True)
+class CategoryFinding:
+    category: str
+    color: str
+    text: str
+
+    def to_record(self):
+        return [self.category, self.color, self.text]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+
+@dataclass(slots=True)
+class Analysis:
+    findings: list = field(default_factory=list)
+    confidence: Optional[int] = None
+
+    # Answers that don't follow the category format are kept whole in a
+    # single finding without a category
+    @classmethod
+    def from_html(cls, analysis_html):
+        findings = [CategoryFinding(m.group(2).strip(), m.group(1).strip(), m.group(3))
+                    for m in _FINDING.finditer(analysis_html or "")]
+        if not findings and analysis_html and analysis_html.strip():
+            findings = [CategoryFinding("", "", analysis_html.strip())]
+        confidence = _CONFIDENCE.search(analysis_html or "")
+        return cls(findings, int(confidence.group(1)) if confidence else None)
+
+    def categories(self):
+        return sorted({finding.category for finding in self.findings if finding.category})
+
+    def to_record(self):
+        return [[finding.to_record() for finding in self.findings], self.confidence]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls([CategoryFinding.from_record(f) for f in record[0]], record[1])
+
+
+@dataclass(slots=True, frozen=True)
+class ImageFinding:
+    path: str
+    summary: str
+    page: Optional[int] = None
+
+    # Stored as a plain list in the results store's images column
+    def to_record(self):
+        return [self.path, self.summary, self.page]
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(*record)
+
+
+@dataclass(slots=True)
+class DocumentResult:
+    doc_hash: str
+    path: Optional[str] = None
+    score: Optional[int] = None
+    analysis: Optional[Analysis] = None
+    triggers: list = field(default_factory=list)
+    images: list = field(default_factory=list)
+
+    def categories(self):
+        return self.analysis.categories() if self.analysis is not None else []
+
+    def to_record(self):
+        return [
+            self.doc_hash,
+            self.path,
+            self.score,
+            self.analysis.to_record() if self.analysis is not None else None,
+            [t.to_record() for t in self.triggers],
+            [i.to_record() for i in self.images],
+        ]
+
+    @classmethod
+    def from_record(cls, record):
+        doc_hash, path, score, analysis, triggers, images = record
+        return cls(
+            doc_hash,
+            path,
+            score,
+            Analysis.from_record(analysis) if analysis is not None else None,
+            [TriggerPhrase.from_record(t) for t in triggers],
+            [ImageFinding.from_record(i) for i in images],
+        )
+
+
+# msgpack when installed, compact JSON otherwise; loads() reads either, and
+# only needs msgpack for results that were written with it
+def dumps(result):
+    record = result.to_record()
+    if msgpack is not None:
+        return msgpack.packb(record, use_bin_type=True)
+    return json.dumps(record, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if data[:1] == b"[":
+        return DocumentResult.from_record(json.loads(data))
+    if msgpack is None:
+        raise ValueError("This result was written with msgpack, which isn't installed (pip install msgpack)")
+    return DocumentResult.from_record(msgpack.unpackb(data, raw=False))
@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional; tokens are estimated from characters without it
+    tiktoken = None
+
+logger = logging.getLogger("bias_detection.normalize")
+
+# Clean-up of extracted article text before it is shown or sent to a model.
+# pdfminer keeps the PDF's hard line breaks, form feeds between pages and
+# the page furniture (reading-level headers, repeated footers, page
+# numbers), all of which would otherwise be repeated in every prompt. Lines
+# are rejoined into paragraphs, furniture is dropped and whitespace
+# collapsed; paragraphs stay separated by one blank line, which is what
+# lexicon.paragraph_spans and the paragraph index expect.
+
+NORMALIZE_ENABLED = os.getenv("BIAS_NORMALIZE", "1") != "0"
+
+# Lines that are never article content
+FURNITURE_PATTERNS = (
+    re.compile(r"word\s+count:?\s*[\d,]+", re.IGNORECASE),
+    re.compile(r"level:?\s*\d+\s*L", re.IGNORECASE),
+    re.compile(r"page\s+\d+(\s+of\s+\d+)?", re.IGNORECASE),
+)
+# Only furniture at the top or bottom of a page (bare page numbers)
+EDGE_PATTERNS = (re.compile(r"[-– ]*\d{1,4}[-– ]*"),)
+# How many lines at each end of a page count as header/footer
+EDGE_LINES = 3
+# A header/footer must repeat on at least this share of the pages
+REPEAT_SHARE = 0.5
+# A line ending a sentence and shorter than this share of the longest line
+# in its block ends a paragraph
+SHORT_LINE = 0.6
+
+_SENTENCE_END = re.compile(r"[.!?:;\"'”’)]$")
+_SPACES = re.compile(r"[ \t ]+")
+_DIGITS = re.compile(r"\d+")
+_COMPOUND = re.compile(r"\w+-\w+")
+_LAST_WORD = re.compile(r"\w*$")
+_FIRST_WORD = re.compile(r"\w*")
+
+_tiktoken_encoding = None
+
+
+def estimate_tokens(text):
+    if tiktoken is not None:
+        return len(_encoding().encode(text, disallowed_special=()))
+    return len(text) // 4
+
+
+def _encoding():
+    global _tiktoken_encoding
+    if _tiktoken_encoding is None:
+        _tiktoken_encoding = tiktoken.get_encoding("o200k_base")
+    return _tiktoken_encoding
+
+
+def _furniture_key(line):
+    return _DIGITS.sub("#", " ".join(line.lower().split()))
+
+
+# Lines within EDGE_LINES of either end of a page that repeat (digits
+# ignored, so "Page 3" matches "Page 4") on enough of the pages
+def repeated_edge_lines(pages):
+    pages = [[line for line in page.splitlines() if line.strip()] for page in pages]
+    pages = [page for page in pages if page]
+    if len(pages) < 2:
+        return set()
+    counts = {}
+    for page in pages:
+        for key in {_furniture_key(line) for line in page[:EDGE_LINES] + page[-EDGE_LINES:]}:
+            counts[key] = counts.get(key, 0) + 1
+    needed = max(2, math.ceil(REPEAT_SHARE * len(pages)))
+    return {key for key, count in counts.items() if count >= needed}
+
+
+def _strip_furniture(page, repeated):
+    lines = page.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:EDGE_LINES] + content[-EDGE_LINES:])
+    kept, removed = [], 0
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped and (
+            any(p.fullmatch(stripped) for p in FURNITURE_PATTERNS)
+            or i in edges and (_furniture_key(stripped) in repeated or any(p.fullmatch(stripped) for p in EDGE_PATTERNS))
+        ):
+            removed += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), removed
+
+
+# Joins the wrapped lines of one blank-line separated block; a short line
+# that ends a sentence still ends its paragraph. A word split by a hyphen at
+# the line end loses the hyphen unless the document also uses the hyphenated
+# form within a line (a compound such as "long-term").
+def _join_block(lines, compounds):
+    longest = max(len(line) for line in lines)
+    paragraphs, current = [], ""
+    for line in lines:
+        if not current:
+            current = line
+        elif current.endswith("-") and current[-2:-1].isalpha() and line[:1].islower():
+            head, tail = _LAST_WORD.search(current[:-1]).group(0), _FIRST_WORD.match(line).group(0)
+            current = current if f"{head}-{tail}".lower() in compounds else current[:-1]
+            current += line
+        else:
+            current += " " + line
+        if _SENTENCE_END.search(line) and len(line) < SHORT_LINE * longest:
+            paragraphs.append(current)
+            current = ""
+    if current:
+        paragraphs.append(current)
+    return paragraphs
+
+
+def _paragraphs(page, compounds):
+    paragraphs = []
+    for block in re.split(r"\n\s*\n", page):
+        lines = [_SPACES.sub(" ", line).strip() for line in block.splitlines()]
+        lines = [line for line in lines if line]
+        if lines:
+            paragraphs.extend(_join_block(lines, compounds))
+    return paragraphs
+
+
+# Returns (normalized text, report)
+def normalize_article(text):
+    pages = text.split("\f")
+    repeated = repeated_edge_lines(pages)
+    compounds = {word.lower() for word in _COMPOUND.findall(text)}
+    paragraphs, removed, joined = [], 0, 0
+    for page in pages:
+        page, count = _strip_furniture(page, repeated)
+        removed += count
+        page_paragraphs = _paragraphs(page, compounds)
+        # A paragraph cut by the page break continues in lower case
+        if paragraphs and page_paragraphs and not _SENTENCE_END.search(paragraphs[-1]) \
+                and page_paragraphs[0][:1].islower():
+            paragraphs[-1] += " " + page_paragraphs.pop(0)
+            joined += 1
+        paragraphs.extend(page_paragraphs)
+    normalized = "\n\n".join(paragraphs)
+
+    tokens_before, tokens_after = estimate_tokens(text), estimate_tokens(normalized)
+    report = {
+        "pages": len([p for p in pages if p.strip()]),
+        "chars_before": len(text),
+        "chars_after": len(normalized),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "token_reduction": round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0,
+        "furniture_lines_removed": removed,
+        "paragraphs": len(paragraphs),
+        "paragraphs_joined_across_pages": joined,
+    }
+    logger.info(json.dumps({"event": "normalization", **report}))
+    return normalized, report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Normalize extracted article text and report the token reduction")
+    parser.add_argument("files", nargs="+", help="PDF or extracted text files")
+    parser.add_argument("--show", action="store_true", help="print the normalized text")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if path.lower().endswith(".pdf"):
+            from ocr import extract_text_with_ocr
+
+            raw = extract_text_with_ocr(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+        normalized, report = normalize_article(raw)
+        if args.show:
+            print(normalized + "\n")
+        print(f"{path}: {report['tokens_before']} -> {report['tokens_after']} tokens "
+              f"({report['token_reduction']:.1%} fewer), {report['furniture_lines_removed']} furniture lines removed, "
+              f"{report['paragraphs']} paragraphs" + ("" if tiktoken else " (tokens estimated from characters)"))
@@ -0,0 +1,185 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from functools import lru_cache
+from io import StringIO
+
+import fitz  # PyMuPDF
+import PIL.Image  # Pillow
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+from cancellation import check
+
+logger = logging.getLogger("bias_detection.ocr")
+
+# Text extraction with an OCR fallback for scanned pages. pdfminer separates
+# pages with "\f"; pages where it finds (almost) no text are rendered with
+# PyMuPDF and read with Tesseract across a process pool, and the OCR text is
+# put back in their place. OCR results are cached per page on disk, keyed by
+# document hash, page, resolution and language, so re-opening a scan is free.
+# pytesseract and the tesseract binary are optional: without them the
+# pdfminer text is returned unchanged.
+
+OCR_DPI = int(os.getenv("BIAS_OCR_DPI", "300"))
+OCR_LANG = os.getenv("BIAS_OCR_LANG", "eng")
+OCR_WORKERS = int(os.getenv("BIAS_OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_CACHE_DIR = os.getenv("BIAS_OCR_CACHE", ".ocr_cache")
+
+# pages with fewer non-whitespace characters than this are OCR'd
+OCR_MIN_CHARS = int(os.getenv("BIAS_OCR_MIN_CHARS", "50"))
+
+# share of the page an image has to cover to count as a scan of the whole
+# page rather than a figure
+FULL_PAGE_COVERAGE = float(os.getenv("BIAS_FULL_PAGE_COVERAGE", "0.85"))
+
+
+@lru_cache(maxsize=None)
+def ocr_available():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception as e:
+        logger.warning(f"OCR unavailable ({type(e).__name__}); scanned pages are left as extracted")
+        return False
+
+
+# Same output as pdfminer's extract_text, checking the token between pages
+def extract_text(pdf_path, token=None):
+    with open(pdf_path, "rb") as fp, StringIO() as output:
+        resources = PDFResourceManager(caching=True)
+        device = TextConverter(resources, output, codec="utf-8", laparams=LAParams())
+        interpreter = PDFPageInterpreter(resources, device)
+        for page in PDFPage.get_pages(fp, caching=True):
+            check(token)
+            interpreter.process_page(page)
+        return output.getvalue()
+
+
+def split_pages(text, page_count):
+    pages = text.split("\f")[:page_count]
+    return pages + [""] * (page_count - len(pages))
+
+
+def needs_ocr(page_text):
+    return sum(1 for c in page_text if not c.isspace()) < OCR_MIN_CHARS
+
+
+# xrefs of the images that cover (almost) the whole page. Their content is
+# the page's text, read through the text layer or OCR, so they are not sent
+# to the vision model as pictures.
+def full_page_scans(page):
+    area = abs(page.rect)
+    scans = set()
+    for info in page.get_image_info(xrefs=True):
+        if info["xref"] and abs(fitz.Rect(info["bbox"]) & page.rect) >= FULL_PAGE_COVERAGE * area:
+            scans.add(info["xref"])
+    return scans
+
+
+def render_page(pdf_path, number, dpi=OCR_DPI):
+    with fitz.open(pdf_path) as doc:
+        pixmap = doc[number].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return PIL.Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+# Runs in a pool worker
+def ocr_page(pdf_path, number, dpi=OCR_DPI, lang=OCR_LANG):
+    import pytesseract
+
+    return pytesseract.image_to_string(render_page(pdf_path, number, dpi), lang=lang)
+
+
+def _cache_path(doc_hash, number, dpi, lang):
+    return os.path.join(OCR_CACHE_DIR, f"{doc_hash}-p{number}-{dpi}dpi-{lang}.txt")
+
+
+def ocr_pages(pdf_path, numbers, dpi=OCR_DPI, lang=OCR_LANG, workers=None, token=None):
+    from results_store import document_hash
+
+    doc_hash = document_hash(pdf_path)
+    texts, todo = {}, []
+    for number in numbers:
+        path = _cache_path(doc_hash, number, dpi, lang)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                texts[number] = f.read()
+        else:
+            todo.append(number)
+
+    if todo:
+        workers = min(workers or OCR_WORKERS, len(todo))
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        if workers > 1:
+            # Spawned, not forked: the GUI calls this with Qt and worker
+            # threads running, and a forked child can inherit a held lock
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                futures = [pool.submit(ocr_page, pdf_path, number, dpi, lang) for number in todo]
+                for number, future in zip(todo, futures):
+                    while True:
+                        check(token)
+                        try:
+                            texts[number] = future.result(timeout=0.2)
+                            break
+                        except TimeoutError:
+                            continue
+                    _write_cache(doc_hash, number, dpi, lang, texts[number])
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        else:
+            for number in todo:
+                check(token)
+                texts[number] = ocr_page(pdf_path, number, dpi, lang)
+                _write_cache(doc_hash, number, dpi, lang, texts[number])
+    return texts, len(numbers) - len(todo)
+
+
+def _write_cache(doc_hash, number, dpi, lang, text):
+    with open(_cache_path(doc_hash, number, dpi, lang), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+# pdfminer text with every text-less page replaced by its OCR text
+def extract_text_with_ocr(pdf_path, dpi=OCR_DPI, lang=OCR_LANG, workers=None, token=None):
+    start = time.perf_counter()
+    text = extract_text(pdf_path, token)
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    pages = split_pages(text, page_count)
+    numbers = [i for i, page in enumerate(pages) if needs_ocr(page)]
+    if not numbers or not ocr_available():
+        return text
+
+    texts, cached = ocr_pages(pdf_path, numbers, dpi, lang, workers, token)
+    for number, page_text in texts.items():
+        pages[number] = page_text
+    logger.info(json.dumps({
+        "event": "ocr",
+        "pages": page_count,
+        "ocr_pages": len(numbers),
+        "cached_pages": cached,
+        "dpi": dpi,
+        "seconds": round(time.perf_counter() - start, 4),
+    }))
+    return "".join(page + "\f" for page in pages)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract PDF text, OCR'ing pages without a text layer")
+    parser.add_argument("pdf")
+    parser.add_argument("--dpi", type=int, default=OCR_DPI)
+    parser.add_argument("--lang", default=OCR_LANG)
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(extract_text_with_ocr(args.pdf, args.dpi, args.lang, args.workers))
@@ -0,0 +1,175 @@
+import bisect
+import html
+import re
+from array import array
+from functools import lru_cache
+
+from lexicon import paragraph_spans
+from models import TriggerPhrase
+
+# Local lookup of model-returned phrases in the article. The article is
+# normalised once (case, quotes, dashes, whitespace) with a map back to the
+# original offsets, so each phrase resolves to exact character offsets and
+# a 1-based paragraph number without trusting the model's numbering. The map
+# is a packed array (4 bytes per character rather than a list of ints), so
+# the index of a 1,000-page article costs a few times the text, not dozens.
+
+_TRANSLATE = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u00a0": " ",
+})
+
+_TRIGGER_LINE = re.compile(
+    r"<b>\s*Trigger Phrase:\s*</b>\s*(.*?)\s*(?:<br\s*/?>\s*<b>\s*Paragraph:\s*</b>\s*(\d+))?\s*</p>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+_NON_SPACE = re.compile(r"\S+")
+
+_HIGHLIGHT_SPAN = re.compile(r"<span style='color:[^']*font-weight:\s*bold;?'>(.*?)</span>", re.IGNORECASE | re.DOTALL)
+
+
+def _normalize_char(c):
+    return c.translate(_TRANSLATE).lower()
+
+
+def normalize_phrase(phrase):
+    phrase = html.unescape(re.sub(r"<[^>]+>", "", phrase)).strip()
+    phrase = phrase.strip("'\"\u2018\u2019\u201c\u201d").strip()
+    return " ".join(phrase.translate(_TRANSLATE).lower().split())
+
+
+class ParagraphIndex:
+    def __init__(self, text):
+        self.text = text
+        self.spans = paragraph_spans(text)
+        self.starts = [start for start, _ in self.spans]
+
+        lowered = text.translate(_TRANSLATE).lower()
+        if len(lowered) == len(text):
+            self.normalized, self.offsets = _collapse_spaces(lowered)
+        else:
+            # A few characters lower-case to two; map one by one
+            self.normalized, self.offsets = _normalize_by_char(text)
+
+    def paragraph_of(self, offset):
+        return bisect.bisect_right(self.starts, offset)
+
+    # Exact match of one phrase, or None if it doesn't occur in the article
+    def locate(self, phrase):
+        needle = normalize_phrase(phrase)
+        if not needle:
+            return None
+        position = self.normalized.find(needle)
+        if position < 0:
+            return None
+        start = self.offsets[position]
+        end = self.offsets[position + len(needle) - 1] + 1
+        return TriggerPhrase(self.text[start:end], self.paragraph_of(start), start, end)
+
+    def locate_all(self, phrases):
+        matches = []
+        for phrase in phrases:
+            match = self.locate(phrase)
+            if match is not None:
+                matches.append(match)
+        return matches
+
+
+# Each run of whitespace becomes one space, mapped to its first character;
+# leading whitespace is dropped
+def _collapse_spaces(lowered):
+    pieces = []
+    offsets = array("I")
+    for match in _NON_SPACE.finditer(lowered):
+        start, end = match.span()
+        pieces.append(match.group())
+        offsets.extend(range(start, end))
+        if end < len(lowered):
+            pieces.append(" ")
+            offsets.append(end)
+    return "".join(pieces), offsets
+
+
+def _normalize_by_char(text):
+    chars = []
+    offsets = array("I")
+    previous_space = True
+    for i, c in enumerate(text):
+        if c.isspace():
+            if previous_space:
+                continue
+            chars.append(" ")
+            previous_space = True
+        else:
+            chars.append(_normalize_char(c))
+            previous_space = False
+        offsets.append(i)
+    return "".join(chars), offsets
+
+
+# Articles are indexed once and reused by every step that needs offsets
+@lru_cache(maxsize=8)
+def paragraph_index(text):
+    return ParagraphIndex(text)
+
+
+def parse_trigger_phrases(trigger_html):
+    return [normalize_phrase(m.group(1)) for m in _TRIGGER_LINE.finditer(trigger_html)]
+
+
+# Phrases wrapped in a bold colour span by the category highlighter
+def parse_highlighted_phrases(article_html):
+    return [normalize_phrase(p) for p in _HIGHLIGHT_SPAN.findall(article_html)]
+
+
+def format_trigger_html(matches):
+    return "\n".join(
+        f"<p><b>Trigger Phrase:</b> '{html.escape(' '.join(m.phrase.split()), quote=False)}'<br><b>Paragraph:</b> {m.paragraph}</p>"
+        for m in matches
+    )
+
+
+# Drops phrases that don't occur in the article and rewrites the paragraph
+# numbers from their real position
+def verify_triggers(trigger_html, article_text):
+    matches = paragraph_index(article_text).locate_all(parse_trigger_phrases(trigger_html))
+    if not matches:
+        return "<p>No trigger phrases could be verified in the article.</p>", []
+    return format_trigger_html(matches), matches
+
+
+TRIGGER_STYLE = "color:purple; font-weight:bold;"
+
+
+def matches_by_paragraph(matches):
+    by_paragraph = {}
+    for match in sorted(matches, key=lambda m: m.start):
+        by_paragraph.setdefault(match.paragraph, []).append(match)
+    return by_paragraph
+
+
+# One paragraph (a span of the article) as HTML, with its matches wrapped in
+# a highlight span; used on its own by the lazily loaded annotated view
+def render_paragraph_html(article_text, span, matches, style=TRIGGER_STYLE):
+    start, end = span
+    pieces = []
+    cursor = start
+    for match in matches:
+        if match.start < cursor:
+            continue
+        match_end = min(match.end, end)
+        pieces.append(html.escape(article_text[cursor:match.start], quote=False))
+        pieces.append(f"<span style='{style}'>{html.escape(article_text[match.start:match_end], quote=False)}</span>")
+        cursor = match_end
+    pieces.append(html.escape(article_text[cursor:end], quote=False))
+    return "<p>" + "".join(pieces).strip() + "</p>"
+
+
+# The article as HTML paragraphs with each match wrapped in a highlight span
+def render_highlighted_html(article_text, matches, style=TRIGGER_STYLE):
+    by_paragraph = matches_by_paragraph(matches)
+    return "\n".join(
+        render_paragraph_html(article_text, span, by_paragraph.get(number, ()), style)
+        for number, span in enumerate(paragraph_index(article_text).spans, start=1)
+    )
@@ -0,0 +1,139 @@
+import bisect
+import json
+import logging
+import time
+
+import fitz  # PyMuPDF
+from paragraph_index import ParagraphIndex, normalize_phrase, parse_highlighted_phrases
+from pipeline import HIGHLIGHT_STYLES, split_highlight_output
+
+logger = logging.getLogger("bias_detection.export")
+
+# Headless export of the annotated document. Highlights are written onto the
+# original PDF as highlight annotations, so the source layout is preserved
+# and no HTML has to be laid out again. Each page's words are extracted once
+# and joined into one text; phrases are located in it with the same
+# normalisation as the trigger verification, and the matched words' boxes
+# are merged per line into the annotation quads.
+
+TRIGGER_COLOR = "#800080"
+
+# shortest run of words highlighted when a phrase is split across columns
+MIN_RUN = 3
+
+
+def _rgb(hex_color):
+    return tuple(int(hex_color[i:i + 2], 16) / 255 for i in (1, 3, 5))
+
+
+class PdfWordIndex:
+    def __init__(self, doc):
+        self.words = []
+        self.starts = []
+        pieces = []
+        offset = 0
+        for page in doc:
+            for x0, y0, x1, y1, word, block, line, _ in page.get_text("words"):
+                self.starts.append(offset)
+                self.words.append((page.number, block, line, fitz.Rect(x0, y0, x1, y1)))
+                pieces.append(word)
+                offset += len(word) + 1
+        self.index = ParagraphIndex(" ".join(pieces))
+
+    # Matches of the phrase in PDF word order. Multi-column layouts can
+    # interleave a phrase with text from the next column, so a phrase that
+    # doesn't occur whole is matched as its longest runs of MIN_RUN+ words.
+    def _matches(self, phrase):
+        match = self.index.locate(phrase)
+        if match is not None:
+            return [match]
+        words = normalize_phrase(phrase).split()
+        matches = []
+        i = 0
+        while i + MIN_RUN <= len(words):
+            for j in range(len(words), i + MIN_RUN - 1, -1):
+                match = self.index.locate(" ".join(words[i:j]))
+                if match is not None:
+                    matches.append(match)
+                    i = j
+                    break
+            else:
+                i += 1
+        return matches
+
+    # {page number: [line rects]} covering the first occurrence of the phrase,
+    # which may run over several lines or pages; None if it isn't found
+    def locate(self, phrase):
+        lines = {}
+        for match in self._matches(phrase):
+            first = bisect.bisect_right(self.starts, match.start) - 1
+            last = bisect.bisect_right(self.starts, match.end - 1) - 1
+            for page, block, line, rect in self.words[first:last + 1]:
+                key = (page, block, line)
+                lines[key] = lines[key] | rect if key in lines else fitz.Rect(rect)
+        if not lines:
+            return None
+        by_page = {}
+        for (page, _, _), rect in lines.items():
+            by_page.setdefault(page, []).append(rect)
+        return by_page
+
+
+# (phrase, colour, label) for the trigger phrases of a stored result and
+# every category highlight produced in the session
+def collect_highlights(triggers, category_highlights=None):
+    highlights = [(t.phrase, TRIGGER_COLOR, "Trigger phrase") for t in triggers or ()]
+    for category, highlighted_html in (category_highlights or {}).items():
+        article_html, _ = split_highlight_output(highlighted_html)
+        color = HIGHLIGHT_STYLES[category][0]
+        highlights.extend((p, color, category.title()) for p in parse_highlighted_phrases(article_html))
+    return highlights
+
+
+# Writes a copy of pdf_path with the highlights annotated; returns the number
+# of phrases found and not found in the PDF
+def export_annotated_pdf(pdf_path, output_path, highlights):
+    start = time.perf_counter()
+    found = missing = 0
+    with fitz.open(pdf_path) as doc:
+        index = PdfWordIndex(doc)
+        for phrase, color, label in highlights:
+            by_page = index.locate(phrase)
+            if not by_page:
+                missing += 1
+                continue
+            found += 1
+            for number, rects in by_page.items():
+                page = doc[number]
+                annot = page.add_highlight_annot(rects)
+                annot.set_colors(stroke=_rgb(color))
+                annot.set_info(title=label, content=phrase)
+                annot.update()
+        pages = len(doc)
+        doc.save(output_path, garbage=3, deflate=True)
+
+    logger.info(json.dumps({
+        "event": "pdf_export",
+        "pages": pages,
+        "highlights": found,
+        "missing": missing,
+        "seconds": round(time.perf_counter() - start, 4),
+    }))
+    return found, missing
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from results_store import document_hash, get_store
+
+    parser = argparse.ArgumentParser(description="Annotate a PDF with its stored trigger phrases")
+    parser.add_argument("pdf")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    result = get_store().get_result(document_hash(args.pdf))
+    if not result or not result.triggers:
+        parser.exit(1, "No stored trigger phrases for this document; analyse it first.\n")
+    found, missing = export_annotated_pdf(args.pdf, args.output, collect_highlights(result.triggers))
+    print(f"{found} phrases highlighted, {missing} not found in the PDF")
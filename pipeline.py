@@ -0,0 +1,462 @@
+import os
+import base64
+import io
+import json
+import logging
+import re
+from openai import OpenAI
+from dotenv import load_dotenv
+import fitz  # PyMuPDF
+import PIL.Image  # Pillow
+from cancellation import check
+from instrumentation import chat_completion
+from ocr import extract_text_with_ocr, full_page_scans
+from lexicon import suspicious_paragraphs
+from local_classifier import run_fast_score, get_classifier
+from models import ImageFinding
+from normalize import NORMALIZE_ENABLED, normalize_article
+from paragraph_index import (
+    paragraph_index, parse_highlighted_phrases, parse_trigger_phrases, render_highlighted_html, verify_triggers,
+)
+from prompts import build_messages
+from results_store import parse_categories
+from routing import (
+    CONFIDENCE_INSTRUCTION, ESCALATE_BELOW, model_for, route_for, split_confidence, timed_route,
+)
+from semantic_cache import SEMANTIC_CACHE_ENABLED, get_semantic_cache
+
+logger = logging.getLogger("bias_detection.pipeline")
+
+# Colors used for each bias category in the highlighted article:
+# (highlight color, plain color name used in the prompt)
+HIGHLIGHT_STYLES = {
+    "narrative bias": ("#1E90FF", "blue"),
+    "sentiment bias": ("#FF4500", "red"),
+    "regional bias": ("#228B22", "green"),
+    "slant": ("#DAA520", "goldenrod"),
+    "coverage depth": ("#FF8C00", "orange"),
+}
+
+# Only the N paragraphs with the most loaded language are sent to
+# run_triggers and the highlighters; 0 sends the whole article
+PREFILTER_TOP_N = int(os.getenv("BIAS_PREFILTER_TOP_N", "20"))
+
+# Articles the local classifier scores below this skip the LLM score call,
+# and in queue, batch and JSONL runs the analysis and trigger calls too;
+# 0 always uses the LLM
+FAST_MODE_THRESHOLD = int(os.getenv("BIAS_FAST_MODE_THRESHOLD", "0"))
+
+# Stored for articles cleared by triage in place of the model's results
+TRIAGED_ANALYSIS = (
+    "<p><b>Triaged:</b> the local classifier scored this article below the bias threshold, "
+    "so no model analysis was run.</p>"
+)
+TRIAGED_TRIGGERS = "<p>No trigger phrases: the article was cleared by local triage.</p>"
+
+
+# Scanned pages without a text layer are OCR'd when Tesseract is available
+def extract_article(pdf_path, token=None):
+    text = extract_text_with_ocr(pdf_path, token=token)
+    return normalize_article(text)[0] if NORMALIZE_ENABLED else text
+
+
+def run_analysis(file_content, token=None):
+    load_dotenv()
+    client = OpenAI()
+    prompt = (
+        "Analyze the article above for these bias categories:\n"
+        "Narrative Bias, Sentiment Bias, Regional Bias, Slant, and Coverage Depth.\n\n"
+        "Use only HTML formatting. For each section:\n"
+        "- Wrap the explanation in a <p> tag.\n"
+        "- Start with a <b> tag containing the category name, but color the header like so:\n"
+        "  • Narrative Bias: <span style='color:#1E90FF;'> (blue)\n"
+        "  • Sentiment Bias: <span style='color:#FF4500;'> (red-orange)\n"
+        "  • Regional Bias: <span style='color:#228B22;'> (green)\n"
+        "  • Slant: <span style='color:#DAA520;'> (goldenrod)\n"
+        "  • Coverage Depth: <span style='color:#FF8C00;'> (orange)\n"
+        "- Close the colored span and bold tag, and follow it with the analysis text.\n\n"
+        "Example:\n"
+        "<p><b><span style='color:#1E90FF;'>Narrative Bias:</span></b> This article uses a compelling 'us vs. them' story...</p>\n"
+        "<p><b><span style='color:#FF4500;'>Sentiment Bias:</span></b> The wording is emotionally charged...</p>\n"
+        "...and so on.\n\n"
+        "Do not use Markdown. Only return valid HTML.\n"
+        + CONFIDENCE_INSTRUCTION
+    )
+    route = route_for("run_analysis")
+    cache = get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None
+    if cache is not None:
+        cached = cache.lookup(file_content, model_for("run_analysis", route))
+        if cached is not None:
+            return cached
+    with timed_route("run_analysis", route):
+        chat = chat_completion(client, "run_analysis", token=token,
+            messages=build_messages(file_content, prompt),
+            model=model_for("run_analysis", route),
+            max_tokens=650,
+        )
+        analysis, confidence = split_confidence(chat.choices[0].message.content)
+    # An explicitly low confidence or missing categories: redo the analysis
+    # on the strong tier. An answer without a confidence rating gives no
+    # signal either way and is kept
+    categories = len(parse_categories(analysis))
+    reason = None
+    if route != "strong":
+        if confidence is not None and confidence < ESCALATE_BELOW:
+            reason = "low_confidence"
+        elif categories < 5:
+            reason = "missing_categories"
+    if reason is not None:
+        logger.info(json.dumps({
+            "event": "escalation",
+            "step": "run_analysis",
+            "reason": reason,
+            "confidence": confidence,
+            "categories": categories,
+        }))
+        with timed_route("run_analysis", "escalated"):
+            chat = chat_completion(client, "run_analysis", token=token,
+                messages=build_messages(file_content, prompt),
+                model=model_for("run_analysis", "strong"),
+                max_tokens=650,
+            )
+            analysis, _ = split_confidence(chat.choices[0].message.content)
+    if cache is not None:
+        cache.add(file_content, analysis)
+    return analysis
+
+
+# Updates a previous analysis from only the paragraphs that changed in a new
+# version of the article, instead of re-reading the whole article
+def run_analysis_update(previous_analysis, changed_text, removed_text="", token=None):
+    client = OpenAI()
+    prompt = (
+        "The article above contains only the paragraphs that were edited or added in a new version of an article.\n"
+        + ("These paragraphs were removed from the previous version:\n" + removed_text + "\n\n" if removed_text else "")
+        + "Below is the bias analysis of the previous version. Update it so it reflects the new version: "
+        "revise the categories affected by the changed paragraphs and keep every other finding as it is.\n"
+        "Keep exactly the same HTML format, with one <p> per category and the same colored headers.\n"
+        "Do not use Markdown. Only return valid HTML.\n\n"
+        "Previous analysis:\n" + previous_analysis
+    )
+    chat = chat_completion(client, "run_analysis_update", token=token,
+        messages=build_messages(changed_text, prompt),
+        model=model_for("run_analysis_update"),
+        max_tokens=650,
+    )
+    return chat.choices[0].message.content
+
+
+def run_score(analysis, file_content, token=None):
+    client = OpenAI()
+    prompt = (
+        "You are formatting an HTML block of text to display in a PyQt application.\n"
+        "Based on the analysis below of the article above, give a bias score out of 10 (10 = extremely biased), and provide a short summary explaining why.\n\n"
+        "Strict formatting instructions:\n"
+        "- Wrap the score line in a <p> tag, starting with <b>Score:</b> followed by the score (e.g., 6/10).\n"
+        "- Wrap the summary explanation in a separate <p> tag.\n"
+        "- Use ONLY HTML. Do NOT use Markdown or raw text formatting.\n"
+        "- Do NOT write anything before or after the <p> blocks.\n\n"
+        "Example:\n"
+        "<p><b>Score:</b> 7/10</p>\n<p>The article uses emotionally charged language to present a one-sided view...</p>\n\n"
+        "Now generate the output.\n\n"
+        "Analysis:\n" + analysis
+    )
+
+    with timed_route("run_score", route_for("run_score")):
+        chat = chat_completion(client, "run_score", token=token,
+            messages=build_messages(file_content, prompt),
+            model=model_for("run_score"),
+            max_tokens=650,
+        )
+
+    response = chat.choices[0].message.content.strip()
+
+    # Extract the score from the first <p> tag
+    match = re.search(r"<p><b>Score:</b>\s*(\d+)/10</p>", response)
+    if match:
+        score = int(match.group(1))
+        color = "red" if score >= 5 else "green"
+        colored_score_html = f"<p><b>Score:</b> <span style='color:{color};'>{score}/10</span></p>"
+        # Replace the plain score line with colored version
+        response = re.sub(r"<p><b>Score:</b>\s*\d+/10</p>", colored_score_html, response)
+
+    return response
+
+
+# First-pass filter: the local score HTML of a clearly low-bias article,
+# or None when it needs the LLM
+def triage(file_content, threshold=None):
+    threshold = FAST_MODE_THRESHOLD if threshold is None else threshold
+    if not threshold:
+        return None
+    score = get_classifier().score(file_content)
+    return run_fast_score(file_content, score) if score < threshold else None
+
+
+# The local classifier answers for clearly low-bias articles and the LLM is
+# only asked about the rest
+def run_triage_score(analysis, file_content, threshold=None, token=None):
+    return triage(file_content, threshold) or run_score(analysis, file_content, token=token)
+
+
+# Results for an article cleared by triage, without any model call, or None
+def triaged_results(file_content, threshold=None):
+    score_html = triage(file_content, threshold)
+    if score_html is None:
+        return None
+    logger.info(json.dumps({"event": "triaged", "chars": len(file_content)}))
+    return {"analysis": TRIAGED_ANALYSIS, "score_html": score_html, "triggers": TRIAGED_TRIGGERS, "triaged": True}
+
+
+# The pre-filter's paragraph numbers for a task message, or "". The article
+# message stays whole, so every call on an article shares its prompt prefix.
+def focus_paragraphs(article_text):
+    numbers = suspicious_paragraphs(article_text, PREFILTER_TOP_N)
+    if numbers is None:
+        return None, ""
+    listed = ", ".join(map(str, numbers))
+    return numbers, (f"Only consider paragraphs {listed} of the article (paragraphs are separated by blank lines "
+                     "and numbered from 1); the others were screened out as unlikely to be biased.\n\n")
+
+
+def run_triggers(file_content, analysis, token=None):
+    client = OpenAI()
+    _, focus = focus_paragraphs(file_content)
+    prompt = focus + (
+    "You are formatting an HTML block to display trigger phrases in a PyQt application.\n"
+    "Identify 3 trigger phrases that support the bias analysis below, and include the paragraph number for each.\n\n"
+    "Strict formatting instructions:\n"
+    "- Use ONLY HTML.\n"
+    "- For each phrase, wrap the output in a <p> tag.\n"
+    "- Bold the phrase label using <b>Trigger Phrase:</b> and bold the paragraph label with <b>Paragraph:</b>.\n"
+    "- Do NOT use Markdown (**bold**) or raw text formatting.\n"
+    "- Do NOT write anything outside the <p> blocks.\n\n"
+    "Example:\n"
+    "<p><b>Trigger Phrase:</b> 'They always lie to the people.'<br><b>Paragraph:</b> 3</p>\n"
+    "<p><b>Trigger Phrase:</b> 'A corrupt cabal controls the media.'<br><b>Paragraph:</b> 6</p>\n"
+    "<p><b>Trigger Phrase:</b> 'Voices of reason are silenced.'<br><b>Paragraph:</b> 8</p>\n\n"
+    "Now extract trigger phrases from the article above based on this analysis:\n" + analysis
+    )
+    chat = chat_completion(client, "run_triggers", token=token,
+        messages=build_messages(file_content, prompt),
+        model=model_for("run_triggers"),
+        max_tokens=300,
+    )
+    triggers = chat.choices[0].message.content
+
+    # Keep only phrases that really occur, numbered by their real paragraph
+    triggers, _ = verify_triggers(triggers, file_content)
+
+    return triggers
+
+
+def run_annotated_highlighted_article(article_text, trigger_text, token=None):
+    client = OpenAI()
+    prompt = (
+        "Highlight the specific trigger phrases listed below in purple, bold text inside the article above.\n\n"
+        "Trigger Phrases:\n" + trigger_text + "\n\n"
+        "Instructions:\n"
+        "- Wrap each paragraph of the article in a <p> tag.\n"
+        "- Within paragraphs, wrap each trigger phrase in this HTML span:\n"
+        "  <span style='color:purple; font-weight:bold;'>trigger phrase</span>\n"
+        "- Only modify exact phrases from the trigger list. Keep everything else unchanged.\n"
+        "- Use ONLY valid HTML and do not include explanations or intros.\n\n"
+        "- Exclude any unecessary text and just use the main paragraphs in the article. \n"
+    )
+    chat = chat_completion(client, "annotated_highlight", token=token,
+        messages=build_messages(article_text, prompt),
+        model=model_for("annotated_highlight"),
+        max_tokens=3000,
+    )
+    return chat.choices[0].message.content
+
+
+# Verified trigger matches for the article, and the model's highlighted
+# HTML only when none of the phrases can be found in it: (matches, html).
+# trigger_phrases are the stored result's, when trigger_text was stored.
+def annotate_article(article_text, trigger_text, token=None, trigger_phrases=None):
+    matches = trigger_phrases
+    if matches is None:
+        matches = paragraph_index(article_text).locate_all(parse_trigger_phrases(trigger_text))
+    if matches:
+        return matches, None
+    highlighted_html = run_annotated_highlighted_article(article_text, trigger_text, token=token)
+    highlighted_html = re.sub(r"```(?:html)?\n?", "", highlighted_html)
+    return [], highlighted_html.replace("```", "")
+
+
+# Long articles are only reproduced in the pre-filtered paragraphs, so only
+# the model's phrases and explanations are kept; the phrases are rendered
+# onto the full article
+def run_bias_highlight(article_text, category, token=None):
+    client = OpenAI()
+    color, color_name = HIGHLIGHT_STYLES[category]
+    numbers, focus = focus_paragraphs(article_text)
+    scope = f"paragraphs {', '.join(map(str, numbers))} only" if numbers else "the full text"
+    prompt = focus + (
+        f"Identify two specific phrases in the article above that represent {category}.\n"
+        f"Highlight them in {scope} using this format:\n"
+        "- Wrap each paragraph in <p> tags.\n"
+        f"- For each {category} phrase, wrap it with this HTML span:\n"
+        f"  <span style='color:{color}; font-weight:bold;'>phrase</span>\n\n"
+        "After the full article, add **two blank lines**.\n"
+        "Then, provide an explanation for each highlighted phrase in the following format:\n\n"
+        "Phrase: \n"
+        f"Explanation of why it's an example of {category}.\n\n"
+        "Separate each explanation with a single blank line.\n"
+        f"Return ONLY valid HTML that includes the full article (with highlighted phrases in <span style='color:{color_name}'>{color_name}</span>) "
+        "and the list of formatted explanations underneath.\n"
+        "Do not include any extra text or markdown outside of the HTML."
+    )
+
+    step = category.replace(" ", "_") + "_highlight"
+    chat = chat_completion(client, step, token=token,
+        messages=build_messages(article_text, prompt),
+        model=model_for(step),
+        max_tokens=3000,
+    )
+
+    highlighted_html, explanation_html = split_highlight_output(chat.choices[0].message.content)
+    matches = paragraph_index(article_text).locate_all(parse_highlighted_phrases(highlighted_html))
+    body = render_highlighted_html(article_text, matches, style=f"color:{color}; font-weight:bold;")
+    return body + "\n\n" + explanation_html
+
+
+# Splits a highlighter response into the highlighted article and the
+# trailing explanations block
+def split_highlight_output(highlighted_html):
+    highlighted_html = re.sub(r"^```(?:html)?\s*", "", highlighted_html.strip())
+    highlighted_html = re.sub(r"\s*```$", "", highlighted_html)
+
+    parts = highlighted_html.strip().split("\n\n")
+    if len(parts) > 1:
+        split = max(len(parts) - 2, 1)
+        article_html = "\n\n".join(parts[:split])
+        explanation_html = "\n\n".join(parts[split:])
+    else:
+        article_html = highlighted_html
+        explanation_html = ""
+    return article_html, explanation_html
+
+
+# "Phrase: explanation" pairs from the highlighter's explanation block, or
+# None when a block doesn't split cleanly into a phrase and its explanation
+def format_explanations(explanation_text):
+    text = re.sub(r"<br\s*/?>|</p>|</div>", "\n", explanation_text, flags=re.IGNORECASE)
+    pairs = []
+    for block in re.split(r"\n\s*\n", text):
+        bold = re.match(r"\s*(?:<p[^>]*>\s*)?<b>(.*?)</b>\s*:?\s*(.*)", block, re.DOTALL | re.IGNORECASE)
+        lines = [line.strip() for line in re.sub(r"<[^>]+>", "", block).splitlines() if line.strip()]
+        if not lines:
+            continue
+        if bold:
+            phrase, explanation = bold.group(1), re.sub(r"<[^>]+>", " ", bold.group(2))
+        elif len(lines) > 1:
+            phrase, explanation = lines[0], " ".join(lines[1:])
+        else:
+            phrase, _, explanation = lines[0].partition(":")
+        phrase = re.sub(r"^\s*Phrase:\s*", "", re.sub(r"<[^>]+>", "", phrase)).strip().rstrip(":")
+        explanation = " ".join(explanation.split())
+        if not phrase or not explanation:
+            return None
+        pairs.append(f"<p><b>{phrase}</b>: {explanation}</p>")
+    return "\n\n".join(pairs) or None
+
+
+def run_explanation_summary(explanation_text, token=None):
+    route = route_for("summarize_explanations")
+    if route == "local":
+        with timed_route("summarize_explanations", "local"):
+            summary = format_explanations(explanation_text)
+        if summary is not None:
+            return summary
+        route = "fast"
+
+    client = OpenAI()
+    prompt = (
+        "You are given a block of text that includes phrases and their bias explanations. "
+        "Reformat the output into valid HTML where each phrase is bolded, followed by its explanation. "
+        "Use the following format:\n\n"
+        "Phrase: Explanation\n\n"
+        "Separate each pair with a single blank line. Return ONLY valid HTML. Do not return a list, dictionary, markdown, or code block.\n\n"
+        "Input:\n" + explanation_text
+    )
+
+    with timed_route("summarize_explanations", route):
+        chat = chat_completion(client, "summarize_explanations", token=token,
+            messages=[{"role": "user", "content": prompt}],
+            model=model_for("summarize_explanations", route),
+            max_tokens=500,
+        )
+
+    return chat.choices[0].message.content.strip()
+
+
+# Extracted images are written to output_dir (a session's workdir) rather
+# than the current directory so concurrent analyses don't overwrite each other.
+# Returns (image path, extension, page number) for each image; decoding and
+# re-encoding is CPU work, so batch runs do it in worker processes.
+def extract_images(pdf_path, output_dir, token=None):
+    images = []
+    scans_skipped = 0
+    with fitz.open(pdf_path) as pdf:
+        for i in range(len(pdf)):
+            page = pdf[i]
+            scans = full_page_scans(page)
+            for image in page.get_images():
+                # Scanned pages are analysed as text, not as pictures
+                if image[0] in scans:
+                    scans_skipped += 1
+                    continue
+                check(token)
+                base_img = pdf.extract_image(image[0])
+                img = PIL.Image.open(io.BytesIO(base_img["image"]))
+                ext = base_img["ext"]
+                img_path = os.path.join(output_dir, f"image{len(images) + 1}.{ext}")
+                img.save(img_path)
+                images.append((img_path, ext, i + 1))
+        pages = len(pdf)
+    logger.info(json.dumps({
+        "event": "image_extraction",
+        "pages": pages,
+        "images": len(images),
+        "full_page_scans_skipped": scans_skipped,
+    }))
+    return images
+
+
+def describe_image(client, img_path, ext, token=None):
+    prompt = "Briefly describe in 2-3 sentences how this image relates to the bias detected."
+    with open(img_path, "rb") as f:
+        b64 = base64.b64encode(f.read()).decode("utf-8")
+    response = chat_completion(client, "image_analysis", token=token,
+        model=model_for("image_analysis"),
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": f"data:image/{ext};base64,{b64}"}}
+            ]
+        }],
+        max_tokens=200,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def run_image_analysis(pdf_path, output_dir, token=None):
+    client = OpenAI()
+    result_blocks = []
+    for img_path, ext, page in extract_images(pdf_path, output_dir, token=token):
+        check(token)
+        result_blocks.append(ImageFinding(img_path, describe_image(client, img_path, ext, token=token), page))
+    logger.info(json.dumps({"event": "image_analysis", "vision_calls": len(result_blocks)}))
+    return result_blocks
+
+
+def cleanup_extracted_images(output_dir):
+    for filename in os.listdir(output_dir):
+        if filename.lower().startswith("image") and filename.lower().endswith((".png", ".jpg", ".jpeg", ".gif", ".tiff")):
+            try:
+                os.remove(os.path.join(output_dir, filename))
+            except Exception as e:
+                print(f"Could not delete {filename}: {e}")
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import record_cache_hit
+
+logger = logging.getLogger("bias_detection.prefetch")
+
+# Speculative prefetch of the steps that usually follow an analysis (score,
+# trigger phrases, annotated article). They start in the background as soon
+# as the analysis is available; clicking the button then takes the finished
+# (or still running) result instead of starting the call. Importing another
+# document cancels the batch: queued steps never start and results of
+# steps already running are dropped.
+
+PREFETCH_ENABLED = os.getenv("BIAS_PREFETCH", "1") != "0"
+PREFETCH_WORKERS = int(os.getenv("BIAS_PREFETCH_WORKERS", "3"))
+
+
+class Prefetcher:
+    def __init__(self, workers=None):
+        self._executor = ThreadPoolExecutor(max_workers=workers or PREFETCH_WORKERS,
+                                            thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._doc_hash = None
+        self._futures = {}
+        self._cancelled = threading.Event()
+
+    # tasks maps step names to func(prior); prior(name) waits for the result
+    # of a step listed before it. Replaces any batch already running.
+    def start(self, doc_hash, tasks):
+        self.cancel()
+        cancelled = threading.Event()
+        futures = {}
+        for name, func in tasks.items():
+            futures[name] = self._executor.submit(self._run, name, func, lambda n: futures[n].result(), cancelled)
+        # take() pops from its own copy; prior() keeps seeing every step
+        with self._lock:
+            self._doc_hash, self._futures, self._cancelled = doc_hash, dict(futures), cancelled
+
+    def _run(self, name, func, prior, cancelled):
+        if cancelled.is_set():
+            return None
+        start = time.perf_counter()
+        value = func(prior)
+        logger.info(json.dumps({
+            "event": "prefetch_done",
+            "step": name,
+            "seconds": round(time.perf_counter() - start, 4),
+            "cancelled": cancelled.is_set(),
+        }))
+        return value
+
+    # Result of a prefetched step for this document, waiting for it if it is
+    # still running; None if it wasn't prefetched, was cancelled or failed
+    def take(self, doc_hash, name):
+        with self._lock:
+            if doc_hash != self._doc_hash or self._cancelled.is_set():
+                return None
+            future = self._futures.pop(name, None)
+        if future is None:
+            return None
+        start = time.perf_counter()
+        try:
+            value = future.result()
+        except Exception as e:
+            logger.warning(json.dumps({"event": "prefetch_failed", "step": name, "error": type(e).__name__}))
+            return None
+        if value is not None:
+            record_cache_hit(name)
+            logger.info(json.dumps({
+                "event": "prefetch_hit",
+                "step": name,
+                "waited_s": round(time.perf_counter() - start, 4),
+            }))
+        return value
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+            self._doc_hash = None
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+
+_prefetcher = None
+
+
+def get_prefetcher():
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher()
+    return _prefetcher
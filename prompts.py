@@ -0,0 +1,25 @@
+# Prompt layout shared by every article-level model call. The stable system
+# instructions and the article text come first and are byte-identical across
+# run_analysis, run_score, run_triggers and the highlighters, so the provider
+# can serve that prefix from its prompt cache; only the final task message
+# differs between calls. Cache hits show up as cached_tokens in the metrics.
+
+SYSTEM_PROMPT = (
+    "You are a media bias analyst working inside a PyQt application. "
+    "You read news articles and report on five bias categories: "
+    "Narrative Bias (storyline framing), Sentiment Bias (positive/negative choice of words), "
+    "Regional Bias (geographic over/underrepresentation), Slant (partisan word usage or source citations) "
+    "and Coverage Depth (single-source vs multi-source reporting).\n"
+    "The article is given in the next message. The task comes after it. "
+    "Follow the task's formatting instructions exactly and return only what it asks for."
+)
+
+ARTICLE_HEADER = "Article:\n"
+
+
+def build_messages(article_text, task):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": ARTICLE_HEADER + article_text},
+        {"role": "user", "content": task},
+    ]
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from models import Analysis, DocumentResult, ImageFinding, dumps, loads
+
+# Local SQLite store of past analyses, keyed by the SHA-256 of the source
+# document, so results survive restarts and can be queried across many
+# documents without reprocessing. WAL mode lets queue workers write while
+# the GUI reads. Each save also stores the document parsed into a typed
+# DocumentResult (models.py), so readers get it without re-parsing the HTML.
+
+RESULTS_DB = os.getenv("BIAS_RESULTS_DB", "results.db")
+
+COLUMNS = ("path", "article", "analysis", "score_html", "triggers", "images")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_hash TEXT PRIMARY KEY,
+    path TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    score INTEGER,
+    article TEXT,
+    analysis TEXT,
+    score_html TEXT,
+    triggers TEXT,
+    images TEXT,
+    result BLOB
+);
+CREATE TABLE IF NOT EXISTS categories (
+    doc_hash TEXT NOT NULL REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    PRIMARY KEY (doc_hash, category)
+);
+CREATE TABLE IF NOT EXISTS minhash (
+    doc_hash TEXT PRIMARY KEY REFERENCES documents(doc_hash) ON DELETE CASCADE,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band_key TEXT NOT NULL,
+    doc_hash TEXT NOT NULL REFERENCES minhash(doc_hash) ON DELETE CASCADE,
+    PRIMARY KEY (band_key, doc_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_documents_score ON documents(score);
+CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at);
+CREATE INDEX IF NOT EXISTS idx_documents_path ON documents(path, updated_at);
+CREATE INDEX IF NOT EXISTS idx_categories_category ON categories(category, doc_hash);
+"""
+
+_SCORE = re.compile(r"Score:\s*</b>\s*(?:<span[^>]*>)?\s*(\d+)\s*/\s*10", re.IGNORECASE)
+
+
+def document_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def parse_score(score_html):
+    match = _SCORE.search(score_html or "")
+    return int(match.group(1)) if match else None
+
+
+# Category headers from run_analysis, e.g. "Narrative Bias", "Slant"
+def parse_categories(analysis_html):
+    return Analysis.from_html(analysis_html).categories()
+
+
+# A stored row (or any dict with the same fields) parsed into a typed result,
+# trigger phrases resolved to their offsets in the article
+def build_result(stored):
+    from paragraph_index import paragraph_index, parse_trigger_phrases
+
+    triggers = []
+    if stored.get("triggers") and stored.get("article"):
+        triggers = paragraph_index(stored["article"]).locate_all(parse_trigger_phrases(stored["triggers"]))
+    images = stored.get("images") or []
+    if isinstance(images, str):
+        images = json.loads(images)
+    return DocumentResult(
+        stored["doc_hash"],
+        stored.get("path"),
+        parse_score(stored.get("score_html")),
+        Analysis.from_html(stored["analysis"]) if stored.get("analysis") else None,
+        triggers,
+        [ImageFinding.from_record(i) for i in images],
+    )
+
+
+class ResultsStore:
+    def __init__(self, path=None):
+        self.path = path or RESULTS_DB
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # Stores created before typed results were kept
+            if "result" not in {row["name"] for row in conn.execute("PRAGMA table_info(documents)")}:
+                conn.execute("ALTER TABLE documents ADD COLUMN result BLOB")
+
+    # One connection per thread; sqlite3 connections can't be shared
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # The row as a dict; "result" holds it as a DocumentResult
+    def get(self, doc_hash):
+        row = self._connect().execute("SELECT * FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_result(self, doc_hash):
+        stored = self.get(doc_hash)
+        return stored["result"] if stored else None
+
+    # Inserts or updates only the given fields of one document, then
+    # re-parses the updated row into its typed result
+    def save(self, doc_hash, **fields):
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown result fields: {', '.join(sorted(unknown))}")
+        if "images" in fields and fields["images"] is not None:
+            fields["images"] = json.dumps(fields["images"])
+        if "score_html" in fields:
+            fields["score"] = parse_score(fields["score_html"])
+
+        now = time.time()
+        names = list(fields)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"INSERT INTO documents (doc_hash, created_at, updated_at{''.join(', ' + n for n in names)}) "
+                f"VALUES (?, ?, ?{', ?' * len(names)}) "
+                f"ON CONFLICT(doc_hash) DO UPDATE SET updated_at = excluded.updated_at"
+                f"{''.join(f', {n} = excluded.{n}' for n in names)}",
+                (doc_hash, now, now, *fields.values()),
+            )
+            if "analysis" in fields:
+                conn.execute("DELETE FROM categories WHERE doc_hash = ?", (doc_hash,))
+                conn.executemany(
+                    "INSERT INTO categories (doc_hash, category) VALUES (?, ?)",
+                    [(doc_hash, c) for c in parse_categories(fields["analysis"])],
+                )
+            row = conn.execute("SELECT * FROM documents WHERE doc_hash = ?", (doc_hash,)).fetchone()
+            conn.execute("UPDATE documents SET result = ? WHERE doc_hash = ?",
+                         (dumps(build_result(dict(row))), doc_hash))
+
+    # MinHash signature of an analysed article and its LSH band keys (dedup.py)
+    def save_signature(self, doc_hash, signature, band_keys):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO minhash (doc_hash, signature) VALUES (?, ?)", (doc_hash, signature))
+            conn.executemany("INSERT OR IGNORE INTO minhash_bands (band_key, doc_hash) VALUES (?, ?)",
+                             [(key, doc_hash) for key in band_keys])
+
+    # (doc_hash, signature) of every indexed article sharing a band key
+    def signature_candidates(self, band_keys):
+        rows = self._connect().execute(
+            f"SELECT DISTINCT m.doc_hash, m.signature FROM minhash_bands b "
+            f"JOIN minhash m ON m.doc_hash = b.doc_hash WHERE b.band_key IN ({', '.join('?' * len(band_keys))})",
+            list(band_keys),
+        ).fetchall()
+        return [(row["doc_hash"], row["signature"]) for row in rows]
+
+    # Most recent other version of the same file, for incremental re-analysis;
+    # versions only cleared by triage have no analysis to update
+    def latest_for_path(self, path, exclude_hash=None):
+        from pipeline import TRIAGED_ANALYSIS
+
+        row = self._connect().execute(
+            "SELECT * FROM documents WHERE path = ? AND doc_hash != ? AND analysis IS NOT NULL AND analysis != ? "
+            "ORDER BY updated_at DESC LIMIT 1",
+            (path, exclude_hash or "", TRIAGED_ANALYSIS),
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def query(self, min_score=None, max_score=None, category=None, since=None, limit=100):
+        clauses, params = [], []
+        if min_score is not None:
+            clauses.append("d.score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("d.score <= ?")
+            params.append(max_score)
+        if since is not None:
+            clauses.append("d.created_at >= ?")
+            params.append(since)
+        join = ""
+        if category is not None:
+            join = "JOIN categories c ON c.doc_hash = d.doc_hash AND c.category = ?"
+            params.insert(0, category)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT d.doc_hash, d.path, d.score, d.created_at, d.updated_at FROM documents d {join} {where} "
+            f"ORDER BY d.created_at DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    # Rows saved before the result column existed are parsed on read
+    def _row_to_dict(self, row):
+        result = dict(row)
+        if result.get("images"):
+            result["images"] = json.loads(result["images"])
+        result["result"] = loads(result["result"]) if result.get("result") else build_result(result)
+        return result
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = ResultsStore()
+    return _store
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query stored bias analyses")
+    parser.add_argument("--min-score", type=int)
+    parser.add_argument("--max-score", type=int)
+    parser.add_argument("--category", help='e.g. "Slant" or "Narrative Bias"')
+    parser.add_argument("--days", type=float, help="only documents analysed in the last N days")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    for row in get_store().query(args.min_score, args.max_score, args.category, since, args.limit):
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(row["created_at"]))
+        score = f"{row['score']}/10" if row["score"] is not None else "  -  "
+        print(f"{row['doc_hash'][:12]}  {score:>5}  {created}  {row['path'] or ''}")
@@ -0,0 +1,63 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from instrumentation import record_route
+
+# Which model answers each pipeline step. Steps are mapped to a tier and the
+# tiers to models, both overridable from the environment:
+#   BIAS_MODEL_FAST / BIAS_MODEL_DEFAULT / BIAS_MODEL_STRONG  pick the models
+#   BIAS_ROUTE_<STEP>=local|fast|default|strong               re-routes a step
+# "local" steps are answered without a model when the input can be handled
+# by plain parsing and fall back to the fast tier otherwise. run_analysis
+# runs on the default tier and is retried on the strong tier when the
+# answer reports low confidence or is missing categories.
+
+MODEL_TIERS = {
+    "fast": os.getenv("BIAS_MODEL_FAST", "gpt-4.1-nano"),
+    "default": os.getenv("BIAS_MODEL_DEFAULT", "gpt-4o-mini"),
+    "strong": os.getenv("BIAS_MODEL_STRONG", "gpt-4o"),
+}
+
+STEP_ROUTES = {
+    "run_score": "fast",
+    "summarize_explanations": "local",
+}
+
+# run_analysis answers with a confidence below this are redone on the strong tier
+ESCALATE_BELOW = int(os.getenv("BIAS_ESCALATE_BELOW", "6"))
+
+CONFIDENCE_INSTRUCTION = (
+    "After the last category, add an HTML comment rating how confident you are in this analysis "
+    "from 1 to 10, exactly like: <!-- confidence: 8/10 -->"
+)
+
+_CONFIDENCE = re.compile(r"\s*<!--\s*confidence:\s*(\d+)\s*(?:/\s*10)?\s*-->\s*", re.IGNORECASE)
+
+
+def route_for(step):
+    return os.getenv(f"BIAS_ROUTE_{step.upper()}", STEP_ROUTES.get(step, "default"))
+
+
+def model_for(step, route=None):
+    route = route or route_for(step)
+    return MODEL_TIERS.get(route, MODEL_TIERS["fast" if route == "local" else "default"])
+
+
+# Returns (analysis without the confidence comment, confidence or None)
+def split_confidence(analysis):
+    match = _CONFIDENCE.search(analysis)
+    if match is None:
+        return analysis, None
+    return (analysis[:match.start()] + analysis[match.end():]).strip(), int(match.group(1))
+
+
+# Times one routed step for the per-route metrics
+@contextmanager
+def timed_route(step, route):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_route(step, route, time.perf_counter() - start)
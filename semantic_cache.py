@@ -0,0 +1,250 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; writers are then only serialized within a process
+    fcntl = None
+
+from instrumentation import estimate_cost, record_cache_hit, record_semantic_lookup
+
+logger = logging.getLogger("bias_detection.semantic_cache")
+
+# Boilerplate-tolerant cache tier for run_analysis. Exact hashes miss
+# articles that only differ in bylines, copyright lines or "read more"
+# links, so each analysed article is also keyed by a digest of its content
+# with those lines set aside, kept in an append-only entries.jsonl. A new
+# article with the same content digest gets the cached analysis back
+# without a model call.
+#
+# Only short lines at the very start or end of the article count as
+# boilerplate; any other difference, however small, is a miss. A similarity
+# score (an earlier version matched hashed bag-of-words embeddings at 0.98
+# cosine) can't tell "negative" from "positive", and one changed word or an
+# added sentence can flip the stance the analysis describes.
+#
+# The GUI, queue workers and batch processes can share one cache directory.
+# Appends hold an exclusive lock on a lock file and re-read the entries
+# appended by other processes first.
+
+SEMANTIC_CACHE_ENABLED = os.getenv("BIAS_SEMANTIC_CACHE", "1") != "0"
+SEMANTIC_CACHE_DIR = os.getenv("BIAS_SEMANTIC_CACHE_DIR", ".semantic_cache")
+
+# Lines that copies of one article add, drop or change
+BOILERPLATE = re.compile(
+    r"(by\s|©|\(c\)|copyright|all rights reserved|read more|related:|share\b|sign up|subscribe|"
+    r"advertisement|updated\b|published\b|photo:|image:|follow us|click here|https?://)",
+    re.IGNORECASE,
+)
+# Boilerplate other than a copyright notice isn't a sentence
+_COPYRIGHT = re.compile(r"©|\(c\)|copyright|all rights reserved", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.!?][\"'”’)]*$")
+# Boilerplate is a run of up to EDGE_LINES lines at the very start or end of
+# the article, each with at most BOILERPLATE_WORDS words; after
+# normalization a line is a whole paragraph, and a paragraph of article text
+# is content wherever it starts with "By" or "Updated"
+EDGE_LINES = 3
+BOILERPLATE_WORDS = 10
+
+# Model output of one analysis, for the savings estimate
+ANALYSIS_COMPLETION_TOKENS = 650
+
+
+def _is_boilerplate(line):
+    if len(line.split()) > BOILERPLATE_WORDS or not BOILERPLATE.match(line):
+        return False
+    return not _SENTENCE_END.search(line) or _COPYRIGHT.search(line) is not None
+
+
+# Digest of the article without its boilerplate lines, case and spacing ignored
+def content_hash(text):
+    lines = [" ".join(line.lower().split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    start, end = 0, len(lines)
+    while start < min(EDGE_LINES, end) and _is_boilerplate(lines[start]):
+        start += 1
+    while end > max(start, len(lines) - EDGE_LINES) and _is_boilerplate(lines[end - 1]):
+        end -= 1
+    digest = hashlib.sha256()
+    for line in lines[start:end]:
+        digest.update(line.encode("utf-8") + b"\n")
+    return digest.hexdigest()
+
+
+class SemanticCache:
+    def __init__(self, directory=None):
+        self.directory = directory or SEMANTIC_CACHE_DIR
+        self.entries_path = os.path.join(self.directory, "entries.jsonl")
+        self.lock_path = os.path.join(self.directory, "lock")
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._hashes = set()
+        self._end = 0
+        with self._lock:
+            self._refresh()
+
+    # Reads entry lines appended since the last call, by this or another
+    # process; a trailing line without its newline (an append in progress
+    # or interrupted) is left for later
+    def _refresh(self):
+        if not os.path.exists(self.entries_path):
+            return
+        with open(self.entries_path, "rb") as f:
+            f.seek(self._end)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                self._offsets.setdefault(entry.get("content_hash"), self._end)
+                self._hashes.add(entry["text_hash"])
+                self._end += len(line)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    # Cached entry for an article with the same content, or None
+    def match(self, text):
+        digest = content_hash(text)
+        with self._lock:
+            self._refresh()
+            offset = self._offsets.get(digest)
+        if offset is None:
+            return None
+        with open(self.entries_path, "rb") as f:
+            f.seek(offset)
+            entry = json.loads(f.readline())
+        return entry if entry.get("content_hash") == digest else None
+
+    # Cached analysis of the same article content, or None
+    def lookup(self, text, model=None):
+        entry = self.match(text)
+        hit = entry is not None
+        saved_tokens, saved_cost = 0, 0.0
+        if hit:
+            # Rough prompt size: about four characters per token
+            prompt_tokens = len(text) // 4
+            saved_tokens = prompt_tokens + ANALYSIS_COMPLETION_TOKENS
+            saved_cost = estimate_cost(model, prompt_tokens, ANALYSIS_COMPLETION_TOKENS) if model else 0.0
+            record_cache_hit("run_analysis")
+        record_semantic_lookup(hit, saved_tokens, saved_cost)
+        logger.info(json.dumps({
+            "event": "semantic_cache",
+            "hit": hit,
+            "entries": len(self),
+            "saved_tokens": saved_tokens,
+        }))
+        return entry["analysis"] if hit else None
+
+    def add(self, text, analysis):
+        from results_store import text_hash
+
+        digest = text_hash(text)
+        line = (json.dumps({"text_hash": digest, "content_hash": content_hash(text), "analysis": analysis})
+                + "\n").encode("utf-8")
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, _locked(self.lock_path):
+            self._refresh()
+            if digest in self._hashes:
+                return
+            with open(self.entries_path, "ab") as f:
+                # An interrupted append left a partial entry; it is dropped
+                f.truncate(self._end)
+                f.write(line)
+            self._offsets.setdefault(json.loads(line)["content_hash"], self._end)
+            self._hashes.add(digest)
+            self._end += len(line)
+
+
+# Exclusive lock shared by every process using the directory
+@contextmanager
+def _locked(path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_semantic_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+    return _cache
+
+
+# Copies of article.txt that must (True) or must not (False) share its
+# content digest; run with --check after changing BOILERPLATE or content_hash
+def check_cases(article):
+    first, _, rest = article.partition("\n\n")
+    return [
+        ("byline, copyright and link added", True,
+         "By Jane Doe, Example News\n\n" + article + "\n\n© 2024 Example News. All rights reserved.\n\n"
+         "Read more: https://example.com/news"),
+        ("spacing and case changed", True, article.replace("\n\n", "\n\n\n").upper()),
+        ("'negative' changed to 'positive'", False, article.replace("negative", "positive")),
+        ("stance-flipping paragraph appended", False,
+         article + "\n\nBy all accounts, video games are harmless and this student is wrong."),
+        ("short stance sentence appended", False, article + "\n\nBy most measures, the student is wrong."),
+        ("paragraph starting with 'Updated' inserted", False,
+         first + "\n\nUpdated figures show the opposite of what the study found.\n\n" + rest),
+    ]
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    from jsonl_ingest import read_articles
+    from routing import model_for
+
+    parser = argparse.ArgumentParser(description="Report how many articles of a JSONL dump the cache would answer, "
+                                                 "without calling any model")
+    parser.add_argument("input", nargs="?", help="JSONL file of articles (as for jsonl_ingest.py)")
+    parser.add_argument("--text-field")
+    parser.add_argument("--check", metavar="ARTICLE",
+                        help="instead, check which edited copies of this text file would share its cache entry")
+    args = parser.parse_args()
+
+    if args.check:
+        from normalize import normalize_article
+
+        with open(args.check, "r", encoding="utf-8") as f:
+            article = normalize_article(f.read())[0]
+        failed = 0
+        for name, expected, copy in check_cases(article):
+            same = content_hash(normalize_article(copy)[0]) == content_hash(article)
+            failed += same != expected
+            print(f"{'ok' if same == expected else 'FAIL':<5} {'hit' if same else 'miss':<5} {name}")
+        sys.exit(1 if failed else 0)
+    if not args.input:
+        parser.error("an input file or --check is required")
+
+    cache = SemanticCache()
+    model = model_for("run_analysis")
+    lookups = hits = saved_tokens = 0
+    saved_cost = 0.0
+    for _, _, text, error in read_articles(args.input, args.text_field):
+        if error is not None:
+            continue
+        lookups += 1
+        if cache.match(text) is not None:
+            hits += 1
+            saved_tokens += len(text) // 4 + ANALYSIS_COMPLETION_TOKENS
+            saved_cost += estimate_cost(model, len(text) // 4, ANALYSIS_COMPLETION_TOKENS)
+    print(f"{len(cache)} cached analyses")
+    print(f"{hits}/{lookups} articles would be answered from the cache "
+          f"({hits / lookups if lookups else 0.0:.1%} hit rate), saving about {saved_tokens} tokens "
+          f"(${saved_cost:.4f} at {model} prices)")
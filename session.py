@@ -0,0 +1,59 @@
+import shutil
+import tempfile
+
+from cancellation import CancelToken
+from results_store import document_hash
+
+# Everything one analysis needs to keep between steps. Each open document
+# (GUI window, queue job, benchmark run) gets its own Session instead of
+# sharing article.txt / trigger_phrases.txt / image files in the current
+# directory, so analyses can run side by side in one process or many.
+
+
+class Session:
+    def __init__(self, pdf_path=None, doc_hash=None):
+        self.pdf_path = pdf_path
+        self.doc_hash = doc_hash or (document_hash(pdf_path) if pdf_path else None)
+        self.article_text = None
+        self.analysis = None
+        self.score_html = None
+        self.trigger_text = None
+        # trigger matches for the annotated view, or the model's annotated
+        # HTML when none of the phrases could be found in the article
+        self.annotated_matches = None
+        self.annotated_html = None
+        self.explanation = ""
+        # raw highlighter output per category, and the previous version's
+        # results when this session replaced an edited copy of the same file
+        self.highlights = {}
+        self.previous_highlights = {}
+        # cancelled when the session is closed, which stops its model calls
+        self.token = CancelToken()
+        self._workdir = None
+
+    # Per-session temporary directory for extracted images, created on first use
+    @property
+    def workdir(self):
+        if self._workdir is None:
+            self._workdir = tempfile.mkdtemp(prefix="bias-session-")
+        return self._workdir
+
+    # Also empties the caches keyed by article text (paragraph index, MinHash),
+    # which would otherwise keep the closed document's text alive until
+    # eight newer articles pushed it out
+    def close(self):
+        from dedup import minhash
+        from paragraph_index import paragraph_index
+
+        self.token.cancel()
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+        paragraph_index.cache_clear()
+        minhash.cache_clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,35 @@
+import hashlib
+import os
+
+import PIL.Image  # Pillow
+
+# On-disk thumbnail cache for extracted images. Thumbnails are keyed by the
+# SHA-256 of the image bytes, so the same picture is only decoded and scaled
+# once, across sessions and documents; the GUI loads the small PNG instead
+# of the full-resolution original.
+
+THUMBNAIL_DIR = os.getenv("BIAS_THUMBNAIL_CACHE", ".thumbnail_cache")
+THUMBNAIL_SIZE = 300
+
+
+def image_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Path of the cached thumbnail (fitting a size x size box), created on first use
+def thumbnail_path(image_path, size=THUMBNAIL_SIZE):
+    path = os.path.join(THUMBNAIL_DIR, f"{image_hash(image_path)}-{size}.png")
+    if not os.path.exists(path):
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        with PIL.Image.open(image_path) as img:
+            img.draft("RGB", (size, size))
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            img.thumbnail((size, size), PIL.Image.LANCZOS)
+            tmp_path = path + ".tmp"
+            img.save(tmp_path, "PNG")
+        os.replace(tmp_path, path)
+    return path
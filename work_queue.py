@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelToken, Cancelled
+
+logger = logging.getLogger("bias_detection.queue")
+
+# Background queue for analysing many PDFs. Job state is persisted to a JSON
+# file after every change so a crash or restart resumes where it left off:
+# jobs that were running are put back to pending on load.
+
+QUEUE_STATE_FILE = os.getenv("BIAS_QUEUE_STATE", "queue_state.json")
+QUEUE_WORKERS = int(os.getenv("BIAS_QUEUE_WORKERS", "2"))
+
+# Seconds one document may take before its calls are cancelled; 0 = no limit
+JOB_TIMEOUT = float(os.getenv("BIAS_JOB_TIMEOUT", "0"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+# Default per-document work: the same steps as the main window buttons.
+# Results go to the results store; the job only keeps the document hash.
+def process_document(path, token=None):
+    from dedup import index_document, reuse_duplicate
+    from pipeline import extract_article, run_analysis, run_triage_score, run_triggers, triaged_results
+    from results_store import get_store, document_hash
+
+    doc_hash = document_hash(path)
+    store = get_store()
+    stored = store.get(doc_hash)
+    if stored and stored["analysis"] and stored["score_html"] and stored["triggers"]:
+        return {"doc_hash": doc_hash, "score": stored["result"].score, "categories": stored["result"].categories()}
+
+    article = extract_article(path, token=token)
+    # Near-duplicates of an analysed article reuse its results; articles the
+    # local classifier clears need no model call at all
+    reused = reuse_duplicate(article, store, exclude_hash=doc_hash, token=token) or triaged_results(article) or {}
+    analysis = reused.get("analysis") or run_analysis(article, token=token)
+    store.save(doc_hash, path=path, article=article, analysis=analysis,
+               score_html=reused.get("score_html") or run_triage_score(analysis, article, token=token),
+               triggers=reused.get("triggers") or run_triggers(article, analysis, token=token))
+    if not reused:
+        index_document(doc_hash, article, store)
+    result = store.get_result(doc_hash)
+    return {"doc_hash": doc_hash, "duplicate_of": reused.get("duplicate_of"), "triaged": bool(reused.get("triaged")),
+            "score": result.score, "categories": result.categories()}
+
+
+class WorkQueue:
+    def __init__(self, processor=process_document, state_path=None, workers=None, on_update=None, timeout=None):
+        self.processor = processor
+        self.state_path = state_path or QUEUE_STATE_FILE
+        self.workers = workers or QUEUE_WORKERS
+        self.timeout = JOB_TIMEOUT if timeout is None else timeout
+        self._tokens = {}
+        self.on_update = on_update
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._watchers = []
+        self._stop = threading.Event()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.jobs = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read queue state {self.state_path}: {e}")
+            return
+        for job in self.jobs.values():
+            if job["status"] == RUNNING:
+                job["status"] = PENDING
+
+    def _save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _set(self, path, **fields):
+        with self._lock:
+            job = self.jobs[path]
+            job.update(fields, updated=time.time())
+            self._save()
+            snapshot = dict(job)
+        if self.on_update:
+            self.on_update(snapshot)
+
+    # Adds files to the queue; finished files are not processed again and
+    # failed ones only when retry_failed is set
+    def add(self, paths, retry_failed=True):
+        skip = (PENDING, RUNNING, DONE) if retry_failed else (PENDING, RUNNING, DONE, FAILED)
+        added = []
+        with self._lock:
+            for path in paths:
+                path = os.path.abspath(path)
+                job = self.jobs.get(path)
+                if job and job["status"] in skip:
+                    continue
+                self.jobs[path] = {"path": path, "status": PENDING, "error": None, "result": None,
+                                   "updated": time.time()}
+                added.append(path)
+            if added:
+                self._save()
+        for path in added:
+            if self.on_update:
+                self.on_update(dict(self.jobs[path]))
+            if self._executor:
+                self._executor.submit(self._run, path)
+        return added
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bias-queue")
+            with self._lock:
+                pending = [path for path, job in self.jobs.items() if job["status"] == PENDING]
+            for path in pending:
+                self._executor.submit(self._run, path)
+
+    def _run(self, path):
+        with self._lock:
+            job = self.jobs[path]
+            if job["status"] != PENDING:
+                return
+            job.update(status=RUNNING, error=None, updated=time.time())
+            self._save()
+            snapshot = dict(job)
+            token = self._tokens[path] = CancelToken(self.timeout or None)
+        if self.on_update:
+            self.on_update(snapshot)
+        try:
+            result = self.processor(path, token=token)
+        except Cancelled as e:
+            # Jobs interrupted by shutdown resume on the next start
+            status = PENDING if self._stop.is_set() else FAILED
+            logger.warning(f"Stopped processing {path}: {e}")
+            self._set(path, status=status, error=None if status == PENDING else str(e))
+            return
+        except Exception as e:
+            logger.warning(f"Failed to process {path}: {e}")
+            self._set(path, status=FAILED, error=str(e))
+            return
+        finally:
+            with self._lock:
+                self._tokens.pop(path, None)
+        self._set(path, status=DONE, result=result)
+
+    # Cancels a running job; it is marked failed
+    def cancel(self, path):
+        with self._lock:
+            token = self._tokens.get(os.path.abspath(path))
+        if token is not None:
+            token.cancel()
+
+    # Polls a directory and queues every new PDF that appears in it. A file
+    # is only queued once its size and mtime are the same on two polls in a
+    # row, so one still being copied in isn't read half-written; a failed
+    # file is queued again once it has been modified since it failed
+    def watch(self, directory, interval=2.0):
+        def poll():
+            previous = {}
+            while not self._stop.is_set():
+                try:
+                    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(".pdf"))
+                except OSError as e:
+                    logger.warning(f"Could not list inbox {directory}: {e}")
+                    names = []
+                current = {}
+                for name in names:
+                    path = os.path.abspath(os.path.join(directory, name))
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    current[path] = (stat.st_size, stat.st_mtime)
+                stable = [path for path, state in current.items() if previous.get(path) == state]
+                with self._lock:
+                    retry = [path for path in stable if self.jobs.get(path, {}).get("status") == FAILED
+                             and current[path][1] > self.jobs[path]["updated"]]
+                self.add(stable, retry_failed=False)
+                self.add(retry)
+                previous = current
+                self._stop.wait(interval)
+
+        thread = threading.Thread(target=poll, daemon=True, name=f"bias-watch-{directory}")
+        thread.start()
+        self._watchers.append(thread)
+        return thread
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def shutdown(self, wait=False):
+        self._stop.set()
+        with self._lock:
+            tokens = list(self._tokens.values())
+        for token in tokens:
+            token.cancel()
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Process PDFs in the background queue")
+    parser.add_argument("files", nargs="*", help="PDF files to queue")
+    parser.add_argument("--watch", metavar="DIR", help="inbox directory to watch for new PDFs")
+    parser.add_argument("--workers", type=int, default=QUEUE_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    queue = WorkQueue(workers=args.workers,
+                      on_update=lambda job: print(f"{job['status']:<8} {job['path']}"))
+    queue.add(args.files)
+    queue.start()
+    if args.watch:
+        queue.watch(args.watch)
+    try:
+        while args.watch or any(j["status"] in (PENDING, RUNNING) for j in queue.snapshot()):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    queue.shutdown()